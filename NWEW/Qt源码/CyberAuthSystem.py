@@ -1,66 +1,162 @@
 import sys
 import cv2
-import face_recognition
 import numpy as np
 import os
-import mysql.connector
-from mysql.connector import Error
+import threading
+import time
 from concurrent.futures import ThreadPoolExecutor
 from PyQt6.QtWidgets import (
     QApplication, QWidget, QLabel, QLineEdit, QPushButton,
     QVBoxLayout, QHBoxLayout, QGroupBox, QFormLayout,
     QComboBox, QSpacerItem, QGraphicsOpacityEffect
 )
-from PyQt6.QtGui import QFont, QImage, QPixmap
+from PyQt6.QtGui import QFont
 from PyQt6.QtCore import Qt, QTimer, QPropertyAnimation, QPoint, QEasingCurve, pyqtSignal
 from PyQt6.QtCore import pyqtSignal
+from segmented_index import SegmentedIndex
+from face_index import FaceMatch
+from model_loader import models
+from capture_worker import CaptureWorker
+from face_tracker import FaceTrackingStage, box_area
+from face_quality import FaceQualityScorer, select_best, landmark_provider
+from cyber_effects import CyberEffectRenderer
+from display_surface import VideoSurface
+from perf_stats import PerfStats
+from user_store import UserStore, DB_ERRORS, INTEGRITY_ERRORS, DEFAULT_DB_CONFIG
+from embedding_snapshot import USER_DB_DIR
+from embedding_codec import encode_embeddings
+from profile_cache import ProfileCache
+from change_feed import IndexSync
+from recognition_server import RecognitionClient
+from inference_pool import InferencePool
+from face_detectors import DETECTORS, DLIB_DETECTORS, create_detector, calibrate, load_choice, save_choice
+from embedding_backends import create_embedding_backend
+
 
 class CyberAuthSystem(QWidget):
     # 定义身份验证成功信号
     authentication_success = pyqtSignal()
+    # 模型加载完成信号，参数为错误信息（成功时为空字符串）
+    models_ready = pyqtSignal(str)
+    # 状态栏更新信号（消息, 类型）；后台线程发出时排队到界面线程执行
+    status_changed = pyqtSignal(str, str)
 
     def __init__(self):
         super().__init__()
+        self.status_changed.connect(self.show_status)
         # 数据库配置
-        self.db_config = {
-            'host': 'localhost',
-            'user': 'root',
-            'password': '123456',
-            'database': 'cyber_auth'
-        }
-        self.db_connection = None
-        self.connect_to_db()
+        self.db_config = dict(DEFAULT_DB_CONFIG)
+        # 存储后端：mysql，或 sqlite（db_config['database'] 为数据库文件路径，用于测试）
+        self.db_backend = "mysql"
+        self.store = None
 
         # 初始化UI组件
         self.animation = None
         self.overlay_effect = None
         self.executor = ThreadPoolExecutor(max_workers=3)
+        self.active_futures = set()
         self.bg_color = "#FAFAFA"
         self.neon_blue = "#00B4FF"
         self.dark_text = "#2D2D2D"
         self.scan_speed = 3
-        self.scan_alpha = 0.0
         self.effect_level = 0.1
+        # 预览特效渲染：单帧耗时超出预算（毫秒）时自动降级
+        self.effects = CyberEffectRenderer(budget_ms=12.0, scan_speed=self.scan_speed)
+        # 热路径性能统计：F3 切换屏幕叠加层，定时写入 perf_dump_path（为 None 时不写）
+        self.perf = PerfStats()
+        self.perf_dump_path = os.path.join(USER_DB_DIR, "perf_stats.json")
+        self.perf_dump_interval = 60.0
+        # 帧从采集到显示超过该时长（秒）记为迟到帧
+        self.late_frame_threshold = 0.1
 
         # 初始化界面
         self.init_ui()
         self.init_video_capture()
 
         # 用户数据
-        self.user_encodings = {}
-        self.user_info = {}
-        self.load_database()
-
-        # 视频处理参数
-        self.process_frame = True
+        # 匹配索引：exact 为精确扫描（终端规模下最快且身份准确）；
+        # ivf 为近似最近邻，只在数万用户以上才值得使用，nprobe 越大召回越高、耗时越长
+        self.index_backend = "exact"
+        # 编码存储与匹配精度：float32（默认）或 float16，数据库 BLOB 同样按此精度写入
+        self.embedding_dtype = np.float32
+        self.index_options = {"dtype": self.embedding_dtype}
+        if self.index_backend == "ivf":
+            self.index_options["nprobe"] = 8
+        # 按用户状态分区，认证只搜索非离职分区；index_by_position 为 True 时再按职务细分
+        self.index_by_position = False
+        self.index_path = os.path.join(USER_DB_DIR, "face_index")
+        self.face_index = SegmentedIndex.open(
+            self.index_path, self.index_backend, self.index_by_position, **self.index_options)
+        # 用户资料不常驻内存：匹配成功后按工号读取，LRU 缓存并预取最近识别过的用户
+        self.profiles = ProfileCache(self.fetch_profiles, capacity=512)
+        self.recent_path = os.path.join(USER_DB_DIR, "recent_visitors.json")
+        self.profiles.load_recent(self.recent_path)
+        # 数据库不可用时使用 user_db 目录中的资料
+        self.offline_profiles = {}
+        # 多终端增量同步：每 sync_interval 秒拉取其他终端的注册与变更；
+        # 快照整体重写开销较大，最多每 snapshot_interval 秒写一次，关闭时再写一次
+        self.sync = None
+        self.sync_interval = 5.0
+        self.snapshot_interval = 300.0
+        # 启动时数据库不可用：按这些间隔（秒，最后一个重复使用）在后台重连
+        self.db_retry_delays = (5, 10, 30, 60)
+        self.db_retry_stop = threading.Event()
+        # 客户端模式：设为 (主机, 端口) 时由识别服务（recognition_server.py）检测与匹配，
+        # 本机不加载用户编码；注册仍在本机编码后写入数据库，服务端通过增量同步获得
+        self.recognition_server = None
+        self.recognizer = None
+        # 检测与编码默认在本进程线程中执行（0），可使用人脸跟踪；多核且内存充足的机器可设为
+        # 工作进程数（None 为 CPU 核数减一）以提高突发吞吐，每个进程各加载一份模型，且不使用跟踪
+        self.inference_processes = 0
+        self.inference = None
+        self.auth_future = None
+        self.registration_future = None
+        # 人脸检测器按本机校准结果选择（不同架构的终端各用各自最快的）；
+        # 尚未校准时先用 dlib hog，模型就绪后在后台用摄像头画面校准一次
+        self.detector_name = load_choice()
+        self.detector_min_recall = 0.9
+        self.calibration_frames = 15
+        # 编码后端：dlib，或 onnx（切换前先运行 embedding_backends.py 检查与库中编码的一致性）
+        self.embedding_backend = "dlib"
+        try:
+            self.embedder = create_embedding_backend(self.embedding_backend)
+        except (OSError, RuntimeError) as e:
+            self.perf.count("embedding_fallbacks")
+            self.update_status(f"⚠ 编码后端 {self.embedding_backend} 不可用，改用 dlib: {e}", "warning")
+            self.embedding_backend = "dlib"
+            self.embedder = create_embedding_backend("dlib")
+        # 数据库与模型都在后台加载，窗口和摄像头预览先显示
+        self.submit_task(self.load_user_data)
+        self.start_model_warmup()
+
+        # 视频处理参数（process_frame 为连续识别开关）
+        self.process_frame = False
         self.face_detection_interval = 5
         self.frame_count = 0
+        # 连续识别状态：连续若干次检测不到人脸才清除当前身份
+        self.identity_hold_count = 3
+        self.current_identities = set()
+        self.lost_face_count = 0
+        self.inference_future = None
+        self.skipped_inferences = 0
+        # 缩小分辨率检测 + 模板匹配跟踪，每次重新检测或漂移时重新编码
+        self.face_stage = FaceTrackingStage(scale=0.5, detect_interval=10,
+                                            detector=self.make_detector(self.detector_name))
+        self.init_perf_stats()
+        # 注册采样：在 enroll_window 秒内每隔 enroll_interval 秒取一帧，按质量保留最好的 enroll_keep 条编码
+        self.enroll_window = 2.5
+        self.enroll_interval = 0.15
+        self.enroll_keep = 5
 
         # 连接信号
         self.authentication_success.connect(self.launch_main_interfaces)
 
     def update_status(self, message, status_type="normal"):
-        """更新状态显示"""
+        """更新状态显示；可在任意线程调用（注册写线程、同步线程、识别任务等）"""
+        self.status_changed.emit(message, status_type)
+
+    def show_status(self, message, status_type):
+        """在界面线程中刷新状态栏"""
         status_colors = {
             "success": "#00FF88",
             "warning": "#FFAA00",
@@ -78,50 +174,37 @@ class CyberAuthSystem(QWidget):
             font-weight: bold;
         """)
 
-    def connect_to_db(self):
-        """建立数据库连接并初始化表结构"""
+    def connect_to_db(self, report=True):
+        """建立存储层（每线程独立连接）并初始化表结构；失败时 self.store 保持为 None"""
+        store = UserStore(self.db_config, backend=self.db_backend)
         try:
-            # 先创建数据库（如果不存在）
-            connection = mysql.connector.connect(
-                host=self.db_config['host'],
-                user=self.db_config['user'],
-                password=self.db_config['password']
-            )
-            cursor = connection.cursor()
-            cursor.execute(f"CREATE DATABASE IF NOT EXISTS {self.db_config['database']}")
-            cursor.close()
-            connection.close()
-
-            # 连接到目标数据库
-            self.db_connection = mysql.connector.connect(
-                host=self.db_config['host'],
-                user=self.db_config['user'],
-                password=self.db_config['password'],
-                database=self.db_config['database']
-            )
-            self.create_tables()
-        except Error as e:
-            self.update_status(f"数据库连接失败: {str(e)}", "error")
-
-    def create_tables(self):
-        """创建用户表"""
-        create_table_query = """
-        CREATE TABLE IF NOT EXISTS users (
-            job_number VARCHAR(20) PRIMARY KEY,
-            name VARCHAR(50) NOT NULL,
-            phone VARCHAR(20),
-            position VARCHAR(50),
-            status VARCHAR(20),
-            face_encoding BLOB
-        )
-        """
+            store.ensure_schema()
+        except DB_ERRORS as e:
+            store.close()
+            if report:
+                self.update_status(f"数据库连接失败: {str(e)}", "error")
+            return
+        self.store = store
+
+    def retry_db_connection(self):
+        """数据库不可用时按退避间隔重连，连上后开始增量同步（在重连线程中执行）"""
+        attempt = 0
+        while self.store is None:
+            delay = self.db_retry_delays[min(attempt, len(self.db_retry_delays) - 1)]
+            if self.db_retry_stop.wait(delay):
+                return
+            attempt += 1
+            self.connect_to_db(report=False)
+        if self.sync is None:
+            self.update_status("✅ 数据库已连接", "success")
+            return
+        self.sync.store = self.store
         try:
-            cursor = self.db_connection.cursor()
-            cursor.execute(create_table_query)
-            self.db_connection.commit()
-            cursor.close()
-        except Error as e:
-            self.update_status(f"创建表失败: {str(e)}", "error")
+            changed = self.sync.start()
+            self.update_status(
+                f"✅ 数据库已连接，已加载 {len(self.face_index)} 位用户数据（增量 {changed} 条）", "success")
+        except DB_ERRORS as e:
+            self.update_status(f"数据库加载错误: {str(e)}", "error")
 
     def init_ui(self):
         """初始化用户界面"""
@@ -174,6 +257,8 @@ class CyberAuthSystem(QWidget):
         # 功能按钮
         self.btn_register = QPushButton("📸 生物特征注册")
         self.btn_login = QPushButton("🔓 实时身份验证")
+        self.btn_continuous = QPushButton("👁 无感连续识别")
+        self.btn_continuous.setCheckable(True)
 
         # 样式设置
         input_style = f"""
@@ -206,13 +291,17 @@ class CyberAuthSystem(QWidget):
                 background: qlineargradient(x1:0, y1:0, x2:1, y2:0,
                     stop:0 #0099FF, stop:1 #003399);
             }}
+            QPushButton:checked {{
+                background: qlineargradient(x1:0, y1:0, x2:1, y2:0,
+                    stop:0 #00FF88, stop:1 #00B4FF);
+            }}
         """
 
         # 应用样式
         for widget in [self.name_input, self.job_number_input, self.phone_input,
                        self.position_combo, self.status_combo]:
             widget.setStyleSheet(input_style)
-        for btn in [self.btn_register, self.btn_login]:
+        for btn in [self.btn_register, self.btn_login, self.btn_continuous]:
             btn.setStyleSheet(button_style)
             btn.setCursor(Qt.CursorShape.PointingHandCursor)
 
@@ -222,6 +311,7 @@ class CyberAuthSystem(QWidget):
         panel_layout.addSpacerItem(QSpacerItem(20, 30))
         panel_layout.addWidget(self.btn_register)
         panel_layout.addWidget(self.btn_login)
+        panel_layout.addWidget(self.btn_continuous)
         control_panel.setLayout(panel_layout)
 
         # 视频面板
@@ -232,7 +322,8 @@ class CyberAuthSystem(QWidget):
             background: #1A1A2E;
             position: relative;
         """)
-        self.video_container = QLabel()
+        self.video_container = VideoSurface()
+        self.video_container.stats = self.perf
         self.video_container.setAlignment(Qt.AlignmentFlag.AlignCenter)
         self.video_container.setStyleSheet("""
             background: rgba(0,0,0,0.8);
@@ -249,6 +340,17 @@ class CyberAuthSystem(QWidget):
             border-radius: 8px;
             border-left: 5px solid {self.neon_blue};
         """)
+        # 性能叠加层：浮在预览画面左上角，默认隐藏
+        self.perf_overlay = QLabel(self.video_container)
+        self.perf_overlay.setStyleSheet("""
+            background: rgba(0, 0, 0, 0.6);
+            color: #00FF88;
+            font-family: Consolas, monospace;
+            font-size: 12px;
+            padding: 6px;
+        """)
+        self.perf_overlay.move(10, 10)
+        self.perf_overlay.hide()
         video_layout = QVBoxLayout()
         video_layout.addWidget(self.video_container)
         video_layout.addWidget(self.status_label, alignment=Qt.AlignmentFlag.AlignBottom)
@@ -264,15 +366,15 @@ class CyberAuthSystem(QWidget):
         # 绑定事件
         self.btn_register.clicked.connect(self.register_user)
         self.btn_login.clicked.connect(self.authenticate_user)
+        self.btn_continuous.toggled.connect(self.set_continuous_mode)
 
     def init_video_capture(self):
         """初始化视频采集设备"""
         try:
-            self.cap = cv2.VideoCapture(0)
-            if not self.cap.isOpened():
-                raise Exception("无法打开摄像头")
-            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+            # 采集线程独占摄像头，界面与识别任务只读取其发布的最新帧
+            self.capture = CaptureWorker(0, 640, 480, stats=self.perf)
+            self.capture.start()
+            self.display_seq = 0
             self.timer = QTimer(self)
             self.timer.timeout.connect(self.update_frame)
             self.timer.start(30)
@@ -292,177 +394,454 @@ class CyberAuthSystem(QWidget):
             self.update_status("⚠ 请填写所有必填信息", "warning")
             return
 
+        if self.registration_future is not None and not self.registration_future.done():
+            self.perf.count("coalesced_requests")
+            return
+
+        if self.store is None:
+            self.update_status("❌ 数据库不可用，暂时无法注册", "error")
+            return
+
         def registration_task():
             try:
-                # 采集面部特征
-                encodings = []
-                for _ in range(5):
-                    ret, frame = self.cap.read()
-                    if ret:
-                        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                        face_locs = face_recognition.face_locations(rgb_frame)
-                        if face_locs:
-                            encoding = face_recognition.face_encodings(rgb_frame, face_locs)[0]
-                            encodings.append(encoding)
-
-                if encodings:
-                    # 序列化面部编码
-                    avg_encoding = np.mean(encodings, axis=0)
-                    encoding_bytes = avg_encoding.tobytes()
-
-                    # 插入数据库
-                    insert_query = """
-                    INSERT INTO users 
-                    (job_number, name, phone, position, status, face_encoding)
-                    VALUES (%s, %s, %s, %s, %s, %s)
-                    """
-                    cursor = self.db_connection.cursor()
-                    cursor.execute(insert_query, (
-                        job_number,
-                        name,
-                        phone,
-                        position,
-                        status,
-                        encoding_bytes
-                    ))
-                    self.db_connection.commit()
-                    cursor.close()
-
-                    # 更新内存数据
-                    self.user_encodings[job_number] = avg_encoding
-                    self.user_info[job_number] = {
-                        "name": name,
-                        "job_number": job_number,
-                        "phone": phone,
-                        "position": position,
-                        "status": status
-                    }
-
-                    self.update_status(f"✅ {name} 注册成功", "success")
-            except mysql.connector.IntegrityError:
-                self.update_status("⚠ 工号已存在", "error")
-            except Error as e:
-                self.update_status(f"❌ 数据库错误: {str(e)}", "error")
+                # 在一段时间内分散采样，按清晰度、人脸大小与姿态评分
+                if self.inference is None:
+                    face_recognition = models.face_recognition
+                    scorer = FaceQualityScorer(landmarks=landmark_provider(face_recognition))
+                candidates, chips, samples = [], [], []
+                last_seq = 0
+                deadline = time.monotonic() + self.enroll_window
+                self.update_status("📷 正在采集，请正对镜头并保持不动", "normal")
+                while time.monotonic() < deadline:
+                    packet = self.capture.wait_for_frame(last_seq)
+                    if not packet:
+                        continue
+                    last_seq = packet.seq
+                    if self.inference is not None:
+                        # 各采样帧并行在工作进程中评分编码，优先级低于认证
+                        samples.append(self.inference.enroll_sample(packet.frame, key=("enroll", packet.seq)))
+                        time.sleep(self.enroll_interval)
+                        continue
+                    rgb_frame = cv2.cvtColor(packet.frame, cv2.COLOR_BGR2RGB)
+                    face_locs = self.face_stage.detect(rgb_frame)
+                    if face_locs:
+                        # 多人入镜时以面积最大（离镜头最近）的人脸为注册对象
+                        face_loc = max(face_locs, key=box_area)
+                        quality = scorer.score(rgb_frame, face_loc)
+                        if quality > 0:
+                            # 采样时只做对齐，结束后把得分最高的几张一次批量编码
+                            chips.extend((quality, chip) for chip in self.embedder.aligner.align(rgb_frame, [face_loc]))
+                    time.sleep(self.enroll_interval)
+                candidates.extend(c for c in (sample.result() for sample in samples) if c is not None)
+                best_chips = sorted(chips, key=lambda c: c[0], reverse=True)[:self.enroll_keep]
+                if best_chips:
+                    encodings = self.embedder.encode_crops([chip for _, chip in best_chips])
+                    candidates.extend(zip([quality for quality, _ in best_chips], encodings))
+
+                encoding_set = select_best(candidates, self.enroll_keep)
+                if encoding_set is None:
+                    self.update_status("⚠ 未采集到合格的人脸图像，请调整光线与角度后重试", "warning")
+                else:
+                    # 序列化编码集合（带精度头部的 K×128 数组）
+                    encoding_bytes = encode_embeddings(encoding_set, self.embedding_dtype)
+
+                    def on_written(row, error):
+                        """写线程提交完成后更新内存数据"""
+                        if isinstance(error, INTEGRITY_ERRORS):
+                            self.update_status("⚠ 工号已存在", "error")
+                        elif error is not None:
+                            self.update_status(f"❌ 数据库错误: {str(error)}", "error")
+                        else:
+                            self.face_index.add(job_number, encoding_set, status, position)
+                            self.profiles.put(job_number, {
+                                "name": name,
+                                "job_number": job_number,
+                                "phone": phone,
+                                "position": position,
+                                "status": status
+                            })
+                            self.update_status(f"✅ {name} 注册成功", "success")
+
+                    # 交给后台写线程批量插入数据库
+                    self.store.enqueue_user(
+                        (job_number, name, phone, position, status, encoding_bytes),
+                        on_written
+                    )
             except Exception as e:
+                self.perf.count("registration_errors")
                 self.update_status(f"❌ 注册失败: {str(e)}", "error")
 
-        self.executor.submit(registration_task)
+        self.registration_future = self.submit_task(registration_task)
+
+    def submit_task(self, fn, *args):
+        """提交后台任务并记录其执行状态"""
+        future = self.executor.submit(fn, *args)
+        self.active_futures.add(future)
+        future.add_done_callback(self.active_futures.discard)
+        return future
+
+    def is_idle(self):
+        """没有注册或识别任务在执行时视为空闲"""
+        return not self.active_futures
+
+    def identify_faces(self, frame, seq=None, fresh=False):
+        """检测并识别一帧中的所有人脸，返回 FaceMatch 列表（按人脸面积从大到小）
+
+        seq 为采集帧序号，进程池模式下同一帧上的重复请求合并为一次推理。
+        fresh 为 True 时不使用跟踪轨迹，重新检测并编码（手动认证不能沿用缓存的编码）。
+        """
+        if self.recognizer is not None:
+            with self.perf.stage("remote"):
+                return self.recognizer.identify(frame, tolerance=0.4)
+        if self.inference is not None:
+            with self.perf.stage("inference"):
+                key = None if seq is None else ("auth", seq)
+                boxes, encodings = self.inference.identify(frame, key=key).result()
+            if not boxes:
+                return []
+            with self.perf.stage("match"):
+                matches = self.face_index.match_batch(encodings, tolerance=0.4)
+            return [
+                FaceMatch(i, tuple(box), *(match or (None, None)))
+                for i, (box, match) in enumerate(zip(boxes, matches))
+            ]
+        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        if fresh:
+            with self.perf.stage("detect"):
+                boxes = sorted(self.face_stage.detect(rgb_frame), key=box_area, reverse=True)
+            if not boxes:
+                return []
+            with self.perf.stage("encode"):
+                encodings = self.embedder.encode(rgb_frame, boxes)
+            with self.perf.stage("match"):
+                matches = self.face_index.match_batch(np.array(encodings), tolerance=0.4)
+            return [
+                FaceMatch(i, box, *(match or (None, None)))
+                for i, (box, match) in enumerate(zip(boxes, matches))
+            ]
+        with self.perf.stage("detect"):
+            tracks = self.face_stage.update(rgb_frame, seq)
+        if not tracks:
+            return []
+        # 两次检测之间跟踪中的轨迹复用编码；需要编码的人脸一次调用批量编码
+        encodings = [track.encoding for track in tracks]
+        pending = [i for i, encoding in enumerate(encodings) if encoding is None]
+        if pending:
+            with self.perf.stage("encode"):
+                new_encodings = self.embedder.encode(rgb_frame, [tracks[i].box for i in pending])
+            for i, encoding in zip(pending, new_encodings):
+                encodings[i] = encoding
+                self.face_stage.mark_encoded(tracks[i], encoding)
+        # 所有人脸在一次矩阵运算中完成匹配
+        with self.perf.stage("match"):
+            matches = self.face_index.match_batch(np.array(encodings), tolerance=0.4)
+        return [
+            FaceMatch(track.track_id, track.box, *(match or (None, None)))
+            for track, match in zip(tracks, matches)
+        ]
+
+    def report_identities(self, job_numbers):
+        """显示已识别用户信息并发出验证成功信号"""
+        lines = []
+        try:
+            profiles = self.profiles.get_many(job_numbers)
+        except DB_ERRORS:
+            profiles = {}
+        self.profiles.touch(job_numbers)
+        for job_number in job_numbers:
+            user_info = profiles.get(job_number)
+            if user_info is None:
+                # 资料读取失败（如数据库暂不可用）时只显示工号
+                lines.append(f"👤 欢迎 工号 {job_number}")
+                continue
+            lines.append(
+                f"👤 欢迎 {user_info['name']}（{user_info['position']}）\n"
+                f"📧 工号: {user_info['job_number']}\n"
+                f"📞 电话: {user_info['phone']}"
+            )
+        self.update_status("\n".join(lines), "success")
+        # 发出身份验证成功信号
+        self.authentication_success.emit()
 
     def authenticate_user(self):
-        """用户认证逻辑"""
+        """用户认证逻辑：同一画面中的多张人脸一次完成验证"""
+        # 上一次认证尚未完成时，重复点击不再排队新任务
+        if self.auth_future is not None and not self.auth_future.done():
+            self.perf.count("coalesced_requests")
+            return
+
         def recognition_task():
             try:
-                ret, frame = self.cap.read()
-                if ret:
-                    rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                    face_locs = face_recognition.face_locations(rgb_frame)
-
-                    if face_locs:
-                        encoding = face_recognition.face_encodings(rgb_frame, face_locs)[0]
-                        matches = face_recognition.compare_faces(
-                            list(self.user_encodings.values()),
-                            encoding,
-                            tolerance=0.4
-                        )
-
-                        if True in matches:
-                            job_number = list(self.user_encodings.keys())[matches.index(True)]
-                            user_info = self.user_info[job_number]
-                            status_msg = (
-                                f"👤 欢迎 {user_info['name']}（{user_info['position']}）\n"
-                                f"📧 工号: {user_info['job_number']}\n"
-                                f"📞 电话: {user_info['phone']}"
-                            )
-                            self.update_status(status_msg, "success")
-                            # 发出身份验证成功信号
-                            self.authentication_success.emit()
-                        else:
-                            self.update_status("❌ 未识别的用户", "error")
-                    else:
+                packet = self.capture.latest() or self.capture.wait_for_frame()
+                if packet:
+                    faces = self.identify_faces(packet.frame, packet.seq, fresh=True)
+                    recognized = [face.job_number for face in faces if face.job_number]
+                    if not faces:
                         self.update_status("⚠ 未检测到人脸", "warning")
+                    elif recognized:
+                        self.report_identities(recognized)
+                    else:
+                        self.update_status("❌ 未识别的用户", "error")
             except Exception as e:
+                self.perf.count("recognition_errors")
                 self.update_status(f"❌ 认证错误: {str(e)}", "error")
 
-        self.executor.submit(recognition_task)
+        self.auth_future = self.submit_task(recognition_task)
+
+    def set_continuous_mode(self, enabled):
+        """开启/关闭无感连续识别"""
+        self.process_frame = enabled
+        self.frame_count = 0
+        self.current_identities = set()
+        self.lost_face_count = 0
+        self.face_stage.reset()
+        if enabled:
+            self.update_status("👁 连续识别已开启，请正对摄像头", "normal")
+        else:
+            self.update_status("连续识别已关闭", "normal")
+
+    def schedule_continuous_recognition(self, packet):
+        """每 N 帧提交一次识别；上一次推理未完成时直接跳过本帧"""
+        self.frame_count += 1
+        if self.frame_count % self.face_detection_interval:
+            return
+        if self.inference_future is not None and not self.inference_future.done():
+            self.skipped_inferences += 1
+            self.perf.count("skipped_inferences")
+            return
+        self.inference_future = self.submit_task(self.continuous_task, packet)
+
+    def continuous_task(self, packet):
+        """连续识别任务：人脸保持在画面内时沿用已识别身份，只为新出现的身份发信号"""
+        try:
+            faces = self.identify_faces(packet.frame, packet.seq)
+            if not faces:
+                self.lost_face_count += 1
+                if self.current_identities and self.lost_face_count >= self.identity_hold_count:
+                    self.current_identities = set()
+                    self.update_status("👁 等待人脸进入画面", "normal")
+                return
+            self.lost_face_count = 0
+            new_identities = [
+                face.job_number for face in faces
+                if face.job_number and face.job_number not in self.current_identities
+            ]
+            if new_identities:
+                self.current_identities.update(new_identities)
+                self.report_identities(new_identities)
+        except Exception as e:
+            self.perf.count("recognition_errors")
+            self.update_status(f"❌ 认证错误: {str(e)}", "error")
+
+    def start_model_warmup(self):
+        """后台加载并预热人脸模型，期间禁用识别相关按钮"""
+        if self.recognition_server is not None:
+            # 客户端模式下识别不需要本机模型，注册时再按需加载
+            self.recognizer = RecognitionClient(*self.recognition_server)
+            self.update_status("✅ 已连接识别服务", "success")
+            return
+        for btn in [self.btn_register, self.btn_login, self.btn_continuous]:
+            btn.setEnabled(False)
+        self.update_status("⏳ 人脸模型预热中…", "warning")
+        self.models_ready.connect(self.on_models_ready)
+        if self.inference_processes != 0:
+            # 每个工作进程各自加载模型；本进程不再加载
+            self.inference = InferencePool(self.inference_processes, detector=self.detector_name,
+                                           embedding=self.embedding_backend)
+            self.inference.warmup().add_done_callback(
+                lambda f: self.models_ready.emit(str(f.exception()) if f.exception() else ""))
+            return
+        models.start(lambda error: self.models_ready.emit(str(error) if error else ""))
+
+    def on_models_ready(self, error):
+        """模型就绪后启用按钮（在界面线程中执行）"""
+        if error:
+            self.update_status(f"❌ 人脸模型加载失败: {error}", "error")
+            return
+        for btn in [self.btn_register, self.btn_login, self.btn_continuous]:
+            btn.setEnabled(True)
+        self.update_status(f"✅ 模型就绪，已加载 {len(self.face_index)} 位用户", "success")
+        if self.detector_name is None and self.recognizer is None:
+            self.submit_task(self.calibrate_detector)
+
+    def make_detector(self, name):
+        """创建检测器；未校准或模型文件缺失时返回 None（使用 dlib hog）"""
+        if name is None:
+            return None
+        try:
+            return create_detector(name)
+        except (OSError, ValueError, cv2.error):
+            return None
+
+    def calibrate_detector(self):
+        """首次启动：在摄像头画面上选出满足召回要求的最快检测器（在后台线程中执行）
+
+        进程池模式下工作进程在下次启动时才使用新的检测器；本进程不加载 dlib，
+        只比较 OpenCV 检测器（以 dnn 为参考，模型缺失时不校准）。
+        """
+        frames, last_seq = [], 0
+        scale = self.face_stage.scale
+        while len(frames) < self.calibration_frames:
+            packet = self.capture.wait_for_frame(last_seq)
+            if packet is None:
+                break
+            last_seq = packet.seq
+            rgb_frame = cv2.cvtColor(packet.frame, cv2.COLOR_BGR2RGB)
+            # 与运行时一致，在缩小后的图像上检测
+            frames.append(cv2.resize(rgb_frame, (0, 0), fx=scale, fy=scale, interpolation=cv2.INTER_AREA))
+            time.sleep(0.1)
+        try:
+            names = [name for name in DETECTORS if name not in DLIB_DETECTORS] if self.inference else None
+            name, results = calibrate(frames, self.detector_min_recall, names)
+        except Exception as e:
+            self.perf.count("calibration_errors")
+            self.update_status(f"⚠ 检测器校准失败，继续使用 {self.detector_name or '默认检测器'}: {e}", "warning")
+            return
+        if name is None:
+            # 样本中人脸太少，下次启动再校准
+            return
+        try:
+            save_choice(name, results)
+        except OSError:
+            pass
+        self.detector_name = name
+        self.face_stage.detector = self.make_detector(name)
+
+    def load_user_data(self):
+        """后台连接数据库并加载用户数据"""
+        self.connect_to_db()
+        if self.recognition_server is None:
+            self.load_database()
+        try:
+            self.profiles.prefetch()
+        except DB_ERRORS:
+            pass
+        if self.store is None:
+            threading.Thread(target=self.retry_db_connection, name="DBReconnect", daemon=True).start()
+
+    def fetch_profiles(self, job_numbers):
+        """资料冷路径：从数据库读取指定用户的资料，数据库不可用时使用离线资料"""
+        if self.store is None:
+            return {j: self.offline_profiles[j] for j in job_numbers if j in self.offline_profiles}
+        profiles = {}
+        for (job_number, name, phone, position, status) in self.store.fetch_profiles(job_numbers):
+            profiles[job_number] = {
+                "name": name,
+                "job_number": job_number,
+                "phone": phone,
+                "position": position,
+                "status": status
+            }
+        return profiles
 
     def load_database(self):
-        """从数据库加载用户数据"""
+        """加载用户数据：先映射本地快照，再只从数据库拉取快照之后变更的行"""
+        self.sync = IndexSync(
+            self.face_index, self.store, index_path=self.index_path,
+            sync_interval=self.sync_interval, snapshot_interval=self.snapshot_interval,
+            on_change=self.on_users_changed,
+            on_error=lambda message: self.update_status(message, "warning"))
+        self.offline_profiles = self.sync.load()
+        if self.store is None:
+            self.update_status(f"⚠ 数据库不可用，使用本地快照 {len(self.face_index)} 位用户（后台重连中）", "warning")
+            return
         try:
-            cursor = self.db_connection.cursor()
-            cursor.execute("SELECT job_number, name, phone, position, status, face_encoding FROM users")
-
-            for (job_number, name, phone, position, status, face_encoding) in cursor:
-                # 反序列化面部编码
-                encoding = np.frombuffer(face_encoding, dtype=np.float64)
-                self.user_encodings[job_number] = encoding
-                self.user_info[job_number] = {
-                    "name": name,
-                    "job_number": job_number,
-                    "phone": phone,
-                    "position": position,
-                    "status": status
-                }
-            cursor.close()
-            self.update_status(f"✅ 已加载 {len(self.user_info)} 位用户数据", "success")
-        except Error as e:
+            # 首次同步：拉取快照之后的变更，并核对已删除的用户
+            changed = self.sync.start()
+            self.update_status(
+                f"✅ 已加载 {len(self.face_index)} 位用户数据（增量 {changed} 条）", "success")
+        except DB_ERRORS as e:
             self.update_status(f"数据库加载错误: {str(e)}", "error")
 
+    def on_users_changed(self, changed, removed):
+        """其他终端注册、修改或删除了用户（在同步线程中执行）"""
+        self.profiles.invalidate(changed | removed)
+        self.perf.count("sync_users", len(changed) + len(removed))
+
     def update_frame(self):
         """更新视频帧"""
-        if self.cap and self.cap.isOpened():
-            ret, frame = self.cap.read()
-            if ret:
-                try:
-                    # 应用特效并显示
-                    frame = self.apply_cyber_effects(frame)
-                    frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                    h, w = frame.shape[:2]
-                    q_img = QImage(frame.data, w, h, w * 3, QImage.Format.Format_RGB888)
-                    self.video_container.setPixmap(
-                        QPixmap.fromImage(q_img).scaled(
-                            self.video_container.width(),
-                            self.video_container.height(),
-                            Qt.AspectRatioMode.KeepAspectRatio,
-                            Qt.TransformationMode.SmoothTransformation
-                        )
-                    )
-                except Exception as e:
-                    self.update_status(f"视频处理错误: {str(e)}", "error")
+        packet = self.capture.latest()
+        if packet is None or packet.seq == self.display_seq:
+            return
+        # 两次刷新之间采集线程发布了多帧，中间的帧没有显示
+        if self.display_seq and packet.seq > self.display_seq + 1:
+            self.perf.count("dropped_frames", packet.seq - self.display_seq - 1)
+        if time.monotonic() - packet.timestamp > self.late_frame_threshold:
+            self.perf.count("late_frames")
+        self.display_seq = packet.seq
+        if self.process_frame:
+            self.schedule_continuous_recognition(packet)
+        try:
+            # 缩放进预分配缓冲区、原地叠加特效后直接绘制；识别繁忙时使用快速缩放
+            with self.perf.stage("scale"):
+                frame = self.video_container.scale_into(packet.frame, smooth=self.is_idle())
+            frame = self.apply_cyber_effects(frame)
+            self.video_container.present(frame)
+        except Exception as e:
+            self.perf.count("frame_errors")
+            self.update_status(f"视频处理错误: {str(e)}", "error")
 
     def apply_cyber_effects(self, frame):
-        """应用赛博朋克风格特效"""
+        """在预览缓冲区上原地叠加赛博朋克风格特效"""
         try:
-            # 动态模糊效果
-            kernel_size = int(5 * abs(np.sin(np.radians(self.scan_alpha))))
-            kernel_size = kernel_size + 1 if kernel_size % 2 == 0 else kernel_size
-            blurred = cv2.GaussianBlur(frame, (kernel_size, kernel_size), 0)
-            frame = cv2.addWeighted(frame, 0.7, blurred, 0.3, 0)
-
-            # 网格效果
-            h, w = frame.shape[:2]
-            grid_color = (0, 255, 255)
-            for i in range(1, 3):
-                cv2.line(frame, (w // 3 * i, 0), (w // 3 * i, h), grid_color, 1)
-                cv2.line(frame, (0, h // 3 * i), (w, h // 3 * i), grid_color, 1)
-
-            # 扫描线动画
-            self.scan_alpha = (self.scan_alpha + self.scan_speed) % 360
-            scan_pos = int((np.sin(np.radians(self.scan_alpha)) + 1) * h / 2)
-            cv2.line(frame, (0, scan_pos), (w, scan_pos), (100, 255, 255), 2)
-
-            # 边缘检测
-            edges = cv2.Canny(frame, 100, 200)
-            edges = cv2.cvtColor(edges, cv2.COLOR_GRAY2BGR)
-            return cv2.addWeighted(frame, 0.9, edges, 0.1, 0)
+            with self.perf.stage("effects"):
+                return self.effects.render(frame)
         except Exception as e:
+            self.perf.count("effect_errors")
             return frame
 
+    def init_perf_stats(self):
+        """注册状态量，启动定时写入与叠加层刷新"""
+        self.perf.gauge("executor_queue", lambda: len(self.active_futures))
+        self.perf.gauge("effect_quality", lambda: self.effects.quality)
+        self.perf.gauge("capture_read_failures", lambda: self.capture.read_failures)
+        self.perf.gauge("surface_allocations", lambda: self.video_container.last_frame_allocations)
+        if self.perf_dump_path:
+            self.perf.start_dump(self.perf_dump_path, self.perf_dump_interval)
+        self.perf_timer = QTimer(self)
+        self.perf_timer.timeout.connect(self.refresh_perf_overlay)
+
+    def toggle_perf_overlay(self):
+        if self.perf_overlay.isVisible():
+            self.perf_timer.stop()
+            self.perf_overlay.hide()
+        else:
+            self.refresh_perf_overlay()
+            self.perf_overlay.show()
+            self.perf_timer.start(500)
+
+    def refresh_perf_overlay(self):
+        self.perf_overlay.setText(self.perf.overlay_text())
+        self.perf_overlay.adjustSize()
+
+    def keyPressEvent(self, event):
+        if event.key() == Qt.Key.Key_F3:
+            self.toggle_perf_overlay()
+        else:
+            super().keyPressEvent(event)
+
     def closeEvent(self, event):
         """关闭事件处理"""
-        if self.cap:
-            self.cap.release()
-        if self.db_connection and self.db_connection.is_connected():
-            self.db_connection.close()
+        self.capture.stop()
+        self.perf.stop_dump(self.perf_dump_path)
+        self.db_retry_stop.set()
+        if self.sync is not None:
+            self.sync.stop()
+        elif self.face_index.dirty:
+            try:
+                self.face_index.save(self.index_path)
+            except OSError:
+                pass
+        if self.recognizer is not None:
+            self.recognizer.close()
+        if self.inference is not None:
+            self.inference.close()
+        try:
+            self.profiles.save_recent(self.recent_path)
+        except OSError:
+            pass
+        if self.store:
+            self.store.close()
         event.accept()
 
     def launch_main_interfaces(self):
@@ -12,16 +12,18 @@ from PySide6.QtGui import QFont, QPainter, QColor, QLinearGradient, QBrush, QPen
 from PySide6.QtCharts import QChart, QChartView, QLineSeries, QValueAxis
 import sys
 from PySide6.QtWidgets import QApplication
+from series_buffer import ChannelSet
+from chart_render import RenderScheduler, AxisRange, replace_series
 
 
 class CyberMonitor(QWidget):
-    def __init__(self):
+    def __init__(self, window_size=15, max_fps=10):
         super().__init__()
-        self.data_count = 0
-        self.temp_data = []
-        self.humi_data = []
-        self.lux_data = []
-        self.x_values = []
+        # 图表显示最近 window_size 个数据点，每秒最多重绘 max_fps 次
+        self.window_size = window_size
+        self.max_fps = max_fps
+        self.series_data = ChannelSet(["temp", "humi", "lux"], window_size)
+        self.latest_values = None
         self.last_temp = 25.0  # 初始默认值
         self.last_humi = 50.0
 
@@ -136,7 +138,7 @@ class CyberMonitor(QWidget):
         chart.setBackgroundBrush(QBrush(grad))
 
         axis_x = QValueAxis()
-        axis_x.setRange(0, 15)
+        axis_x.setRange(0, self.window_size)
         axis_x.setTitleText("数据序列")
         axis_x.setTitleBrush(QColor("#00ffdd"))
         axis_x.setLabelsColor(QColor("#00ffdd"))
@@ -172,56 +174,48 @@ class CyberMonitor(QWidget):
         self.temp_series = self.temp_graph.chart().series()[0]
         self.humi_series = self.humi_graph.chart().series()[0]
         self.lux_series = self.lux_graph.chart().series()[0]
+        graphs = [self.temp_graph, self.humi_graph, self.lux_graph]
+        self.x_axes = [AxisRange(graph.chart().axes(Qt.Horizontal)[0]) for graph in graphs]
+        self.y_axes = [AxisRange(graph.chart().axes(Qt.Vertical)[0]) for graph in graphs]
+        # MQTT 回调只写入数据，图表由界面线程按帧率上限统一重绘
+        self.render_scheduler = RenderScheduler(self.render_charts, self.max_fps, parent=self)
 
     def update_sensor_data(self, temp, humi, lux):
-        self.data_count += 1
-        self.x_values.append(self.data_count)
-
+        """写入一条传感器数据（在 MQTT 线程中调用），图表在下一次重绘时更新"""
         # 应用随机波动（实际使用时可移除）
         temp = float(temp) + random.uniform(-1.5, 1.5)
         humi = float(humi) + random.uniform(-2, 2)
         lux = float(lux) + random.randint(-50, 50)
 
-        self.temp_data.append(max(0, temp))
-        self.humi_data.append(max(0, min(humi, 100)))  # 湿度不超过100%
-        self.lux_data.append(max(0, lux))  # 光照不低于0
-
-        # 更新标签显示
+        with self.render_scheduler.modify():
+            self.series_data.append(
+                temp=max(0, temp),
+                humi=max(0, min(humi, 100)),  # 湿度不超过100%
+                lux=max(0, lux)  # 光照不低于0
+            )
+            self.latest_values = (temp, humi, lux)
+
+    def render_charts(self):
+        """重绘标签与图表（界面线程，调用时已持有数据锁）"""
+        temp, humi, lux = self.latest_values
         self.temp_label.setText(f"温度: {temp:.1f} ℃")
         self.humi_label.setText(f"湿度: {humi:.1f} %RH")
         self.lux_label.setText(f"光照: {lux:.0f} lx")
 
-        # 维护最近15个数据点
-        if len(self.x_values) > 15:
-            self.x_values.pop(0)
-            self.temp_data.pop(0)
-            self.humi_data.pop(0)
-            self.lux_data.pop(0)
-
-        # 更新图表数据
-        self.update_chart(self.temp_series, self.temp_data)
-        self.update_chart(self.humi_series, self.humi_data)
-        self.update_chart(self.lux_series, self.lux_data)
-
-        # 动态调整Y轴范围
-        for chart, data in zip(
-                [self.temp_graph, self.humi_graph, self.lux_graph],
-                [self.temp_data, self.humi_data, self.lux_data]
-        ):
-            y_axis = chart.chart().axes(Qt.Vertical)[0]
-            if data:
-                min_val = max(0, min(data) - 5)
-                max_val = max(data) + 5
-                y_axis.setRange(min_val, max_val)
-
-        # 调整X轴范围
-        x_axis = self.temp_graph.chart().axes(Qt.Horizontal)[0]
-        x_axis.setRange(max(0, self.data_count - 15), self.data_count)
+        # 每条曲线一次 replace() 整体替换
+        self.update_chart(self.temp_series, self.series_data["temp"])
+        self.update_chart(self.humi_series, self.series_data["humi"])
+        self.update_chart(self.lux_series, self.series_data["lux"])
+
+        # 动态调整坐标轴范围（窗口内最值由环形缓冲增量维护），范围不变时不触发重新布局
+        x_range = self.series_data.x_range()
+        for x_axis, y_axis, name in zip(self.x_axes, self.y_axes, ["temp", "humi", "lux"]):
+            data = self.series_data[name]
+            y_axis.set(max(0, data.min() - 5), data.max() + 5)
+            x_axis.set(*x_range)
 
     def update_chart(self, series, data):
-        series.clear()
-        for x, y in zip(self.x_values, data):
-            series.append(x, y)
+        replace_series(series, self.series_data.x_view(), data.view())
 
     def init_status_msg(self):
         self.status_msg = QLabel(self)
@@ -294,6 +288,7 @@ class CyberMonitor(QWidget):
 
     def closeEvent(self, event: QEvent):
         """窗口关闭时清理MQTT资源"""
+        self.render_scheduler.stop()
         self.mqtt_client.loop_stop()  # 停止MQTT网络循环
         self.mqtt_client.disconnect()  # 断开服务器连接
         event.accept()
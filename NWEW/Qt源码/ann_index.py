@@ -0,0 +1,265 @@
+import os
+import threading
+
+import numpy as np
+
+from embedding_codec import STORAGE_DTYPE, compute_dtype
+from face_index import EmbeddingIndex
+
+
+class IVFIndex:
+    """倒排分区（IVF）近似最近邻索引
+
+    先用 k-means 把编码划分到 n_lists 个分区，查询时只扫描距离最近的
+    nprobe 个分区。nprobe 越大召回越高、耗时越长；nprobe == n_lists 即精确搜索。
+    每个分区内部是一个 EmbeddingIndex，候选距离均为精确值。
+    match() 只在最近的 nprobe 个分区中重排序：最近距离比阈值小出 verify_margin 以上时
+    直接采用；落在阈值附近（更近的其他用户最可能改变结论）时才做一次精确扫描。
+    这是近似结果，不保证与精确搜索的身份一致；用户数不大时应使用 exact 后端。
+    用户数增长到上次训练时的 retrain_factor 倍后自动重新训练分区。
+    save()/load() 只持久化分区中心，编码本身由本地快照提供；dirty 表示分区中心有变化。
+    """
+
+    def __init__(self, dim=128, n_lists=64, nprobe=8, train_size=None, exact_fallback=True,
+                 dtype=STORAGE_DTYPE, verify_margin=0.05, retrain_factor=2.0):
+        self.dim = dim
+        self.dtype = np.dtype(dtype)
+        self._compute = compute_dtype(self.dtype)
+        self.n_lists = n_lists
+        self.nprobe = nprobe
+        self.exact_fallback = exact_fallback
+        self.verify_margin = verify_margin
+        self.retrain_factor = retrain_factor
+        # 样本数达到该值后才训练分区，之前全部放在一个分区中做精确扫描
+        self.train_size = train_size if train_size is not None else n_lists * 39
+        self.centroids = None
+        # 上次训练时的用户数，用于判断是否需要重新训练
+        self.trained_users = 0
+        self._lists = [EmbeddingIndex(dim, capacity=16, dtype=self.dtype)]
+        self._assign = {}
+        self._lock = threading.RLock()
+        self.dirty = False
+
+    def __len__(self):
+        return len(self._assign)
+
+    def __contains__(self, job_number):
+        return job_number in self._assign
+
+    @property
+    def trained(self):
+        return self.centroids is not None
+
+    @property
+    def job_numbers(self):
+        return list(self._assign)
+
+    def _nearest_lists(self, vector, count):
+        d = np.sum((self.centroids - vector) ** 2, axis=1)
+        if count >= len(d):
+            return np.argsort(d)
+        top = np.argpartition(d, count - 1)[:count]
+        return top[np.argsort(d[top])]
+
+    def _all_vectors(self):
+        """导出所有编码行：(每行工号, 编码矩阵)，同一用户的多行相邻"""
+        job_numbers, blocks = [], []
+        for part in self._lists:
+            owners, matrix = part.export()
+            job_numbers.extend(owners)
+            blocks.append(matrix)
+        vectors = np.concatenate(blocks) if blocks else np.zeros((0, self.dim), dtype=self.dtype)
+        return job_numbers, vectors.reshape(-1, self.dim)
+
+    @staticmethod
+    def _group_means(job_numbers, vectors):
+        """按用户聚合编码行，返回 (工号列表, 各用户编码均值, 每行所属用户序号)"""
+        users = {}
+        index = np.array([users.setdefault(j, len(users)) for j in job_numbers], dtype=np.int64)
+        sums = np.zeros((len(users), vectors.shape[1]))
+        np.add.at(sums, index, vectors)
+        counts = np.bincount(index, minlength=len(users))[:, None]
+        return list(users), sums / np.maximum(counts, 1), index
+
+    def train(self, iterations=10, seed=0):
+        """以各用户编码均值做 k-means，重新划分分区"""
+        with self._lock:
+            job_numbers, vectors = self._all_vectors()
+            _, means, _ = self._group_means(job_numbers, vectors)
+            n_lists = min(self.n_lists, len(means))
+            if n_lists == 0:
+                return
+            rng = np.random.default_rng(seed)
+            centroids = means[rng.choice(len(means), n_lists, replace=False)].copy()
+            for _ in range(iterations):
+                labels = self._kmeans_assign(means, centroids)
+                for c in range(n_lists):
+                    members = means[labels == c]
+                    if len(members):
+                        centroids[c] = members.mean(axis=0)
+            self._rebuild(centroids, job_numbers, vectors)
+            self.trained_users = len(means)
+
+    @staticmethod
+    def _kmeans_assign(vectors, centroids):
+        sq = (np.sum(centroids ** 2, axis=1)[None, :]
+              - 2.0 * vectors @ centroids.T)
+        return np.argmin(sq, axis=1)
+
+    def _rebuild(self, centroids, job_numbers, vectors):
+        self.centroids = centroids
+        self._lists = [EmbeddingIndex(self.dim, capacity=16, dtype=self.dtype)
+                       for _ in range(len(centroids))]
+        self._assign = {}
+        self._insert(job_numbers, vectors)
+        self.dirty = True
+
+    def _insert(self, job_numbers, vectors):
+        """按用户编码均值分配分区，同一用户的编码集合放在同一分区"""
+        users, means, index = self._group_means(job_numbers, vectors)
+        for job_number in users:
+            old = self._assign.pop(job_number, None)
+            if old is not None:
+                self._lists[old].remove(job_number)
+        if self.trained:
+            labels = self._kmeans_assign(means, self.centroids)
+        else:
+            labels = np.zeros(len(users), dtype=np.int64)
+        row_labels = labels[index]
+        for label in np.unique(labels):
+            rows = np.flatnonzero(row_labels == label)
+            self._lists[label].add_many([job_numbers[i] for i in rows], vectors[rows])
+        for job_number, label in zip(users, labels):
+            self._assign[job_number] = int(label)
+
+    def add(self, job_number, encodings):
+        """增量插入或替换一个用户的编码集合，不触发重训练"""
+        encodings = np.asarray(encodings, dtype=self.dtype).reshape(-1, self.dim)
+        self.add_many([job_number] * len(encodings), encodings)
+
+    def add_many(self, job_numbers, encodings):
+        """批量插入：一次矩阵运算完成分区分配；样本数达到 train_size 时训练，之后按增长倍数重新训练"""
+        encodings = np.asarray(encodings, dtype=self.dtype).reshape(-1, self.dim)
+        if not len(encodings):
+            return
+        with self._lock:
+            self._insert(list(job_numbers), encodings)
+            if not self.trained:
+                if len(self._assign) >= self.train_size:
+                    self.train()
+            elif self.retrain_factor and len(self._assign) >= self.trained_users * self.retrain_factor:
+                self.train()
+
+    def export(self):
+        with self._lock:
+            return self._all_vectors()
+
+    def remove(self, job_number):
+        with self._lock:
+            label = self._assign.pop(job_number, None)
+            if label is None:
+                return False
+            self._lists[label].remove(job_number)
+            return True
+
+    def get(self, job_number):
+        with self._lock:
+            label = self._assign.get(job_number)
+            return None if label is None else self._lists[label].get(job_number)
+
+    def _search_lists(self, encoding, k, lists):
+        results = []
+        for label in lists:
+            results.extend(self._lists[label].search(encoding, k))
+        results.sort(key=lambda item: item[1])
+        return results[:k]
+
+    def search(self, encoding, k=1, nprobe=None):
+        """近似搜索：返回最近的 k 个 (工号, 距离)"""
+        encoding = np.asarray(encoding, dtype=self._compute).reshape(self.dim)
+        with self._lock:
+            if not self.trained:
+                return self._search_lists(encoding, k, [0])
+            probe = nprobe if nprobe is not None else self.nprobe
+            return self._search_lists(encoding, k, self._nearest_lists(encoding, max(1, probe)))
+
+    def exact_search(self, encoding, k=1):
+        encoding = np.asarray(encoding, dtype=self._compute).reshape(self.dim)
+        with self._lock:
+            return self._search_lists(encoding, k, range(len(self._lists)))
+
+    def match(self, encoding, tolerance=0.4):
+        """返回最近且距离不超过阈值的 (工号, 距离)，否则返回 None
+
+        在最近的 nprobe 个分区中取最近用户；距离不超过 tolerance − verify_margin 时直接采用，
+        处于阈值附近时精确扫描确认；未命中且 exact_fallback 时同样回退到精确扫描。
+        verify_margin 为 None 时命中即返回。
+        """
+        best = self.search(encoding, k=1)
+        if best and best[0][1] <= tolerance:
+            if self.verify_margin is None or best[0][1] <= tolerance - self.verify_margin:
+                return best[0]
+        elif not self.exact_fallback:
+            return None
+        if self.trained:
+            best = self.exact_search(encoding, k=1)
+        if best and best[0][1] <= tolerance:
+            return best[0]
+        return None
+
+    def match_batch(self, encodings, tolerance=0.4):
+        """批量匹配：未训练时整体做一次矩阵运算，训练后各查询探测的分区不同，逐个匹配"""
+        encodings = np.asarray(encodings, dtype=self._compute).reshape(-1, self.dim)
+        with self._lock:
+            if not self.trained:
+                return self._lists[0].match_batch(encodings, tolerance)
+            return [self.match(encoding, tolerance) for encoding in encodings]
+
+    def save(self, path):
+        """分区中心与参数持久化到 .npz 文件（先写临时文件再替换，避免写坏）"""
+        with self._lock:
+            centroids = self.centroids if self.trained else np.zeros((0, self.dim))
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                np.savez(
+                    f,
+                    centroids=centroids,
+                    trained_users=np.array(self.trained_users),
+                    params=np.array([self.dim, self.n_lists, self.nprobe, self.train_size]),
+                )
+            os.replace(tmp_path, path)
+            self.dirty = False
+
+    @classmethod
+    def load(cls, path, **kwargs):
+        """载入分区中心，得到空的已训练索引，编码随后通过 add_many 加入"""
+        with np.load(path, allow_pickle=False) as data:
+            dim, n_lists, nprobe, train_size = (int(v) for v in data["params"])
+            params = dict(dim=dim, n_lists=n_lists, nprobe=nprobe, train_size=train_size)
+            params.update(kwargs)
+            index = cls(**params)
+            if len(data["centroids"]):
+                index._rebuild(data["centroids"].copy(), [], np.zeros((0, dim), dtype=index.dtype))
+                # 旧版文件没有记录训练时的用户数，按首次训练的规模计
+                index.trained_users = (int(data["trained_users"]) if "trained_users" in data.files
+                                       else index.train_size)
+            # 旧版文件同时保存了全部编码，写回为只含分区中心的格式
+            index.dirty = "vectors" in data.files
+        return index
+
+
+INDEX_BACKENDS = {
+    "exact": EmbeddingIndex,
+    "ivf": IVFIndex,
+}
+
+
+def create_index(backend="exact", path=None, **kwargs):
+    """按名称创建匹配索引；支持持久化的后端会优先从 path 加载"""
+    index_cls = INDEX_BACKENDS[backend]
+    if path and hasattr(index_cls, "load") and os.path.exists(path):
+        try:
+            return index_cls.load(path, **kwargs)
+        except (OSError, ValueError, KeyError):
+            pass
+    return index_cls(**kwargs)
@@ -0,0 +1,294 @@
+"""人脸认证热路径基准测试
+
+不需要摄像头和 MySQL：用伪采集设备回放合成帧（或录制好的视频/图片目录），
+用随机生成的编码集合填充索引，分别测量检测、编码、匹配和端到端延迟的
+分位数以及内存占用，结果以 JSON 输出，便于在版本之间对比。
+
+示例：
+    python benchmark.py --sizes 1000 10000 100000 --output bench.json
+    python benchmark.py --frames recorded/ --backends exact ivf
+    python benchmark.py --skip-models            # 只测匹配，不加载 dlib 模型
+    python benchmark.py --embedding onnx         # 编码阶段使用 ONNX 后端
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+from ann_index import create_index
+from capture_worker import CaptureWorker
+from embedding_backends import EMBEDDING_BACKENDS, create_embedding_backend
+from face_quality import FaceQualityScorer, select_best, landmark_provider
+from face_tracker import FaceTrackingStage, box_area
+from model_loader import models
+
+BENCHMARK_VERSION = 1
+
+
+class FakeCapture:
+    """与 cv2.VideoCapture 接口一致的伪摄像头，按给定帧率循环回放帧列表"""
+
+    def __init__(self, frames, fps=30.0):
+        self.frames = frames
+        self.interval = 1.0 / fps if fps else 0.0
+        self._index = 0
+        self._next = time.monotonic()
+
+    def isOpened(self):
+        return bool(self.frames)
+
+    def set(self, prop, value):
+        return True
+
+    def read(self):
+        delay = self._next - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        self._next = max(self._next + self.interval, time.monotonic())
+        frame = self.frames[self._index % len(self.frames)]
+        self._index += 1
+        return True, frame
+
+    def release(self):
+        self.frames = []
+
+
+def synthetic_frames(count=30, width=640, height=480, seed=0):
+    """合成测试帧：噪声背景加一个缓慢移动的椭圆“人脸”（检测器一般不会命中）"""
+    rng = np.random.default_rng(seed)
+    frames = []
+    for i in range(count):
+        frame = rng.integers(0, 60, (height, width, 3), dtype=np.uint8)
+        center = (width // 2 + int(20 * np.sin(i / 5)), height // 2)
+        cv2.ellipse(frame, center, (70, 95), 0, 0, 360, (150, 170, 200), -1)
+        cv2.circle(frame, (center[0] - 28, center[1] - 20), 8, (40, 40, 40), -1)
+        cv2.circle(frame, (center[0] + 28, center[1] - 20), 8, (40, 40, 40), -1)
+        frames.append(frame)
+    return frames
+
+
+def recorded_frames(path, limit=300):
+    """读取录制的视频文件或图片目录"""
+    frames = []
+    if os.path.isdir(path):
+        for name in sorted(os.listdir(path)):
+            frame = cv2.imread(os.path.join(path, name))
+            if frame is not None:
+                frames.append(frame)
+            if len(frames) >= limit:
+                break
+    else:
+        cap = cv2.VideoCapture(path)
+        while len(frames) < limit:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frames.append(frame)
+        cap.release()
+    return frames
+
+
+def synthetic_embeddings(users, per_user=5, dim=128, seed=0):
+    """随机编码集合：每位用户一个中心，集合内各条在中心附近小幅扰动"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(0.0, 0.09, (users, dim))
+    noise = rng.normal(0.0, 0.01, (users, per_user, dim))
+    encodings = (centers[:, None, :] + noise).reshape(-1, dim)
+    job_numbers = [f"B{i:07d}" for i in range(users) for _ in range(per_user)]
+    return job_numbers, encodings, centers
+
+
+def summarize(samples):
+    """延迟样本（秒）转换为毫秒分位数"""
+    if not samples:
+        return {"count": 0}
+    ms = np.asarray(samples) * 1000.0
+    return {
+        "count": int(len(ms)),
+        "mean_ms": round(float(ms.mean()), 4),
+        "p50_ms": round(float(np.percentile(ms, 50)), 4),
+        "p90_ms": round(float(np.percentile(ms, 90)), 4),
+        "p99_ms": round(float(np.percentile(ms, 99)), 4),
+        "max_ms": round(float(ms.max()), 4),
+    }
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def bench_matching(backend, users, per_user, queries, options):
+    """构建索引并测量单条、批量匹配延迟以及索引内存"""
+    job_numbers, encodings, centers = synthetic_embeddings(users, per_user)
+    tracemalloc.start()
+    index = create_index(backend, **options.get(backend, {}))
+    _, build = timed(index.add_many, job_numbers, encodings)
+    if hasattr(index, "train") and not index.trained:
+        _, train = timed(index.train)
+        build += train
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    rng = np.random.default_rng(1)
+    picks = rng.integers(0, users, queries)
+    probes = centers[picks] + rng.normal(0.0, 0.01, (queries, centers.shape[1]))
+    single, hits = [], 0
+    for probe, expected in zip(probes, picks):
+        match, elapsed = timed(index.match, probe)
+        single.append(elapsed)
+        hits += bool(match) and match[0] == job_numbers[expected * per_user]
+    batch = [timed(index.match_batch, probes[i:i + 4])[1] for i in range(0, queries, 4)]
+    return {
+        "backend": backend,
+        "users": users,
+        "rows": len(job_numbers),
+        "dtype": index.dtype.name,
+        "build_s": round(build, 4),
+        "build_peak_mb": round(peak / 2 ** 20, 2),
+        "match": summarize(single),
+        "match_batch4": summarize(batch),
+        "recall": round(hits / queries, 4),
+    }, index
+
+
+def bench_pipeline(frames, index, iterations, keep, embedding="dlib"):
+    """用伪摄像头跑检测、编码、匹配和端到端（与认证/注册任务相同的调用顺序）"""
+    face_recognition = models.face_recognition
+    embedder = create_embedding_backend(embedding)
+    capture = CaptureWorker(capture_factory=lambda device: FakeCapture(frames))
+    capture.start()
+    stage = FaceTrackingStage(scale=0.5, detect_interval=10)
+    scorer = FaceQualityScorer(landmarks=landmark_provider(face_recognition))
+    samples = {name: [] for name in ("capture_wait", "convert", "detect", "encode",
+                                     "match", "end_to_end", "quality", "registration")}
+    faces_found = 0
+    try:
+        last_seq = 0
+        for _ in range(iterations):
+            start = time.perf_counter()
+            packet, elapsed = timed(capture.wait_for_frame, last_seq)
+            samples["capture_wait"].append(elapsed)
+            if packet is None:
+                continue
+            last_seq = packet.seq
+            rgb, elapsed = timed(cv2.cvtColor, packet.frame, cv2.COLOR_BGR2RGB)
+            samples["convert"].append(elapsed)
+            boxes, elapsed = timed(stage.detect, rgb)
+            samples["detect"].append(elapsed)
+            faces_found += bool(boxes)
+            # 合成帧上通常检测不到人脸，用画面中心的固定框保证编码与匹配阶段有样本
+            box = max(boxes, key=box_area) if boxes else (140, 420, 380, 220)
+            encodings, elapsed = timed(embedder.encode, rgb, [box])
+            samples["encode"].append(elapsed)
+            _, elapsed = timed(index.match_batch, np.array(encodings))
+            samples["match"].append(elapsed)
+            samples["end_to_end"].append(time.perf_counter() - start)
+            _, elapsed = timed(scorer.score, rgb, box)
+            samples["quality"].append(elapsed)
+
+        # 注册：对 keep 倍数的帧评分并对齐，质量最好的 keep 张一次批量编码后写入索引
+        for _ in range(max(1, iterations // 20)):
+            start = time.perf_counter()
+            candidates = []
+            for _ in range(keep * 2):
+                packet = capture.wait_for_frame(last_seq)
+                if packet is None:
+                    continue
+                last_seq = packet.seq
+                rgb = cv2.cvtColor(packet.frame, cv2.COLOR_BGR2RGB)
+                boxes = stage.detect(rgb)
+                box = max(boxes, key=box_area) if boxes else (140, 420, 380, 220)
+                quality = max(scorer.score(rgb, box), 1e-6)
+                candidates.extend((quality, chip) for chip in embedder.aligner.align(rgb, [box]))
+            best = sorted(candidates, key=lambda c: c[0], reverse=True)[:keep]
+            encodings = embedder.encode_crops([chip for _, chip in best])
+            index.add("BENCH-ENROLL", select_best(list(zip([quality for quality, _ in best], encodings)), keep))
+            samples["registration"].append(time.perf_counter() - start)
+        index.remove("BENCH-ENROLL")
+    finally:
+        capture.stop()
+    result = {name: summarize(values) for name, values in samples.items()}
+    result["frames_with_faces"] = faces_found
+    result["read_failures"] = capture.read_failures
+    return result
+
+
+def peak_rss_mb():
+    """进程峰值常驻内存；Windows 下 resource 模块不可用时返回 None"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为 KB，macOS 为字节
+    return round(rss / (2 ** 20 if sys.platform == "darwin" else 2 ** 10), 2)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="人脸认证热路径基准测试")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000],
+                        help="索引中的用户数")
+    parser.add_argument("--per-user", type=int, default=5, help="每位用户的编码条数")
+    parser.add_argument("--backends", nargs="+", default=["exact", "ivf"])
+    parser.add_argument("--nprobe", type=int, default=8)
+    parser.add_argument("--dtype", choices=["float16", "float32", "float64"], default="float32",
+                        help="编码存储精度")
+    parser.add_argument("--queries", type=int, default=200, help="每种规模的匹配次数")
+    parser.add_argument("--iterations", type=int, default=100, help="端到端测试的帧数")
+    parser.add_argument("--frames", help="录制的视频文件或图片目录；不指定时使用合成帧")
+    parser.add_argument("--skip-models", action="store_true", help="不加载人脸模型，只测匹配")
+    parser.add_argument("--embedding", choices=sorted(EMBEDDING_BACKENDS), default="dlib",
+                        help="编码后端")
+    parser.add_argument("--output", help="结果 JSON 文件；不指定时输出到标准输出")
+    args = parser.parse_args(argv)
+
+    options = {"exact": {"dtype": args.dtype}, "ivf": {"nprobe": args.nprobe, "dtype": args.dtype}}
+    report = {
+        "version": BENCHMARK_VERSION,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "args": vars(args),
+        "matching": [],
+        "pipeline": None,
+    }
+    pipeline_index = None
+    for users in args.sizes:
+        for backend in args.backends:
+            result, index = bench_matching(backend, users, args.per_user, args.queries, options)
+            report["matching"].append(result)
+            print(f"{backend:>5} {users:>7} 用户: 匹配 p50 {result['match']['p50_ms']} ms, "
+                  f"p99 {result['match']['p99_ms']} ms, 召回 {result['recall']}", file=sys.stderr)
+            if users == args.sizes[0] and pipeline_index is None:
+                pipeline_index = index
+
+    if not args.skip_models:
+        frames = recorded_frames(args.frames) if args.frames else synthetic_frames()
+        try:
+            report["pipeline"] = bench_pipeline(frames, pipeline_index, args.iterations, args.per_user,
+                                                args.embedding)
+        except (RuntimeError, OSError) as e:
+            report["pipeline"] = {"error": str(e)}
+    report["peak_rss_mb"] = peak_rss_mb()
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
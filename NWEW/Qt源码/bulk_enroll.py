@@ -0,0 +1,214 @@
+"""批量注册工具
+
+从照片目录批量生成人脸编码并写入用户库和/或本地快照。支持两种输入：
+
+1. 与 user_db 相同的目录结构：<目录>/<工号>/info.json + 该目录下的照片
+2. 照片目录 + CSV 文件，CSV 列为 job_number,name,phone,position,status,photo
+   （photo 为相对于照片目录的路径，同一工号可出现多行对应多张照片）
+
+编码总是写入数据库，各终端通过增量同步获得。已存在的工号默认写入失败；
+加 --update-existing 时改为更新其编码（例如换用新照片重新编码），updated_at 随之刷新。
+--target both 另外把编码合并进本机快照，本机终端下次启动时无需再从数据库拉取；
+快照只是数据库的本地副本，终端运行时会用内存中的数据覆盖它。
+
+示例：
+    python bulk_enroll.py contractors/ --csv contractors.csv --workers 8
+    python bulk_enroll.py staff/ --update-existing --target db
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+
+from embedding_backends import create_embedding_backend
+from embedding_codec import encode_embeddings, STORAGE_DTYPE
+from embedding_snapshot import EmbeddingSnapshot, USER_DB_DIR, SNAPSHOT_DIR
+from face_quality import FaceQualityScorer, select_best, landmark_provider
+from user_store import UserStore, DEFAULT_DB_CONFIG, DB_ERRORS, INTEGRITY_ERRORS
+
+PHOTO_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+# 子进程内复用的编码后端（ONNX 会话创建开销较大）
+_embedders = {}
+
+
+def load_sidecar_jobs(source_dir):
+    """读取 <工号>/info.json 结构的目录"""
+    jobs = []
+    for entry in sorted(os.listdir(source_dir)):
+        folder = os.path.join(source_dir, entry)
+        info_path = os.path.join(folder, "info.json")
+        if not os.path.isfile(info_path):
+            continue
+        with open(info_path, "r", encoding="utf-8") as f:
+            info = json.load(f)
+        info.setdefault("job_number", entry)
+        photos = [
+            os.path.join(folder, name) for name in sorted(os.listdir(folder))
+            if name.lower().endswith(PHOTO_EXTENSIONS)
+        ]
+        jobs.append((info, photos))
+    return jobs
+
+
+def load_csv_jobs(source_dir, csv_path):
+    """读取 CSV 描述的用户，同一工号的多张照片合并"""
+    jobs = {}
+    with open(csv_path, "r", encoding="utf-8-sig", newline="") as f:
+        for row in csv.DictReader(f):
+            job_number = row["job_number"].strip()
+            info, photos = jobs.setdefault(job_number, ({
+                "name": row.get("name", "").strip(),
+                "job_number": job_number,
+                "phone": row.get("phone", "").strip(),
+                "position": row.get("position", "").strip() or "员工",
+                "status": row.get("status", "").strip() or "在职",
+            }, []))
+            if row.get("photo"):
+                photos.append(os.path.join(source_dir, row["photo"].strip()))
+    return list(jobs.values())
+
+
+def encode_job(job, keep=5, embedding="dlib"):
+    """子进程任务：对一个用户的所有照片取最大人脸，按质量保留最好的 keep 张并批量编码"""
+    import face_recognition
+
+    info, photos = job
+    embedder = _embedders.get(embedding)
+    if embedder is None:
+        embedder = _embedders[embedding] = create_embedding_backend(embedding)
+    # 照片通常比摄像头帧清晰，清晰度只用于排序，不设硬性下限
+    scorer = FaceQualityScorer(min_sharpness=0.0, landmarks=landmark_provider(face_recognition))
+    candidates = []
+    for path in photos:
+        try:
+            image = face_recognition.load_image_file(path)
+        except (OSError, ValueError):
+            continue
+        locations = face_recognition.face_locations(image)
+        if not locations:
+            continue
+        largest = max(locations, key=lambda b: (b[1] - b[3]) * (b[2] - b[0]))
+        # 不合格的照片保留极小的分数：宁可用质量差的照片，也不要整个用户注册失败
+        quality = max(scorer.score(image, largest), 1e-6)
+        candidates.extend((quality, chip) for chip in embedder.aligner.align(image, [largest]))
+    best = sorted(candidates, key=lambda c: c[0], reverse=True)[:keep]
+    if not best:
+        return info, None
+    encodings = embedder.encode_crops([chip for _, chip in best])
+    return info, select_best(list(zip([quality for quality, _ in best], encodings)), keep)
+
+
+def flush_rows(store, rows, stats, update_existing=False):
+    """一个事务写入一批用户；update_existing 时工号已存在的用户改为更新编码"""
+    existing = []
+    for row, error in store.insert_many(rows):
+        if error is None:
+            stats["written"] += 1
+        elif update_existing and isinstance(error, INTEGRITY_ERRORS):
+            existing.append(row)
+        else:
+            stats["failed"].append((row[0], str(error)))
+    if existing:
+        try:
+            store.update_encodings([(row[-1], row[0]) for row in existing])
+            stats["updated"] += len(existing)
+        except DB_ERRORS as e:
+            stats["failed"].extend((row[0], str(e)) for row in existing)
+    rows.clear()
+
+
+def merge_snapshot(enrolled, snapshot_dir):
+    """把新编码集合合并进本地快照，保留原水位线（数据库中的新行稍后会作为增量再拉取一次）"""
+    snapshot = EmbeddingSnapshot.load(snapshot_dir)
+    if snapshot is None:
+        snapshot = EmbeddingSnapshot.seed_from_user_db(USER_DB_DIR)
+    sets, profiles = {}, {}
+    rows = zip(snapshot.job_numbers, np.asarray(snapshot.encodings), snapshot.statuses, snapshot.positions)
+    for job_number, encoding, status, position in rows:
+        sets.setdefault(job_number, []).append(encoding)
+        profiles[job_number] = (status, position)
+    watermark = snapshot.watermark
+    snapshot.release()
+    for info, encoding_set in enrolled:
+        job_number = str(info["job_number"])
+        sets[job_number] = list(encoding_set)
+        profiles[job_number] = (info.get("status", "在职"), info.get("position", ""))
+    job_numbers = [job for job, encodings in sets.items() for _ in encodings]
+    matrix = np.array([e for encodings in sets.values() for e in encodings], dtype=STORAGE_DTYPE)
+    EmbeddingSnapshot(job_numbers, matrix.reshape(len(job_numbers), -1), watermark,
+                      statuses=[profiles[j][0] for j in job_numbers],
+                      positions=[profiles[j][1] for j in job_numbers]).save(snapshot_dir)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="批量注册人脸")
+    parser.add_argument("source", help="照片目录")
+    parser.add_argument("--csv", help="用户信息 CSV；不指定时读取 <工号>/info.json 结构")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="编码进程数")
+    parser.add_argument("--batch-size", type=int, default=200, help="每个事务写入的行数")
+    parser.add_argument("--keep", type=int, default=5, help="每位用户保留的编码条数")
+    parser.add_argument("--embedding", choices=["dlib", "onnx"], default="dlib", help="编码后端")
+    parser.add_argument("--target", choices=["db", "both"], default="both",
+                        help="both 时另外合并进本机快照（应在本机终端未运行时执行，否则会被覆盖，"
+                             "但数据库中的编码不受影响）")
+    parser.add_argument("--update-existing", action="store_true",
+                        help="工号已存在时更新其编码，而不是报告写入失败")
+    parser.add_argument("--sqlite", help="写入指定的 SQLite 文件而不是 MySQL")
+    parser.add_argument("--snapshot-dir", default=SNAPSHOT_DIR)
+    args = parser.parse_args(argv)
+
+    jobs = load_csv_jobs(args.source, args.csv) if args.csv else load_sidecar_jobs(args.source)
+    print(f"待注册 {len(jobs)} 位用户，使用 {args.workers} 个进程")
+
+    if args.sqlite:
+        store = UserStore({"database": args.sqlite}, backend="sqlite")
+    else:
+        store = UserStore(DEFAULT_DB_CONFIG)
+    try:
+        store.ensure_schema()
+    except DB_ERRORS as e:
+        print(f"数据库连接失败: {e}", file=sys.stderr)
+        return 1
+
+    stats = {"written": 0, "updated": 0, "failed": [], "no_face": []}
+    rows, enrolled = [], []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        for info, encoding_set in pool.map(partial(encode_job, keep=args.keep, embedding=args.embedding), jobs, chunksize=8):
+            job_number = str(info["job_number"])
+            if encoding_set is None:
+                stats["no_face"].append(job_number)
+                continue
+            enrolled.append((info, encoding_set))
+            rows.append((job_number, info.get("name", ""), info.get("phone", ""),
+                         info.get("position", ""), info.get("status", ""),
+                         encode_embeddings(encoding_set)))
+            if len(rows) >= args.batch_size:
+                flush_rows(store, rows, stats, args.update_existing)
+    if rows:
+        flush_rows(store, rows, stats, args.update_existing)
+    store.close()
+    # 写入失败（如工号已存在）的用户不进入快照
+    failed = {job_number for job_number, _ in stats["failed"]}
+    enrolled = [item for item in enrolled if str(item[0]["job_number"]) not in failed]
+    if args.target == "both" and enrolled:
+        merge_snapshot(enrolled, args.snapshot_dir)
+
+    elapsed = time.perf_counter() - start
+    print(f"完成：编码 {len(enrolled)} 位，写库 {stats['written']} 位，"
+          f"更新 {stats['updated']} 位，用时 {elapsed:.1f} 秒")
+    for job_number in stats["no_face"]:
+        print(f"  未检测到人脸: {job_number}")
+    for job_number, error in stats["failed"]:
+        print(f"  写入失败: {job_number} {error}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+import threading
+import time
+from collections import namedtuple
+
+import cv2
+
+# 采集线程发布的帧：序号、采集时间戳（time.monotonic）和 BGR 图像
+# 帧数据由多个消费者共享，只读使用，需要修改时请先 copy()
+FramePacket = namedtuple("FramePacket", ["seq", "timestamp", "frame"])
+
+
+class CaptureWorker(threading.Thread):
+    """独占摄像头的采集线程，持续读取并发布最新一帧"""
+
+    def __init__(self, device=0, width=640, height=480, capture_factory=None, stats=None):
+        super().__init__(name="CaptureWorker", daemon=True)
+        self.device = device
+        self.width = width
+        self.height = height
+        # 允许注入自定义采集设备（测试或基准中的伪摄像头）
+        self.capture_factory = capture_factory or cv2.VideoCapture
+        # 可选的 PerfStats，记录每次读取耗时（含等待摄像头出帧）
+        self.stats = stats
+        self.cap = None
+        self.running = False
+        self.read_failures = 0
+        self._packet = None
+        self._cond = threading.Condition()
+        self._release_lock = threading.Lock()
+
+    def open(self):
+        """打开采集设备，失败时抛出异常"""
+        self.cap = self.capture_factory(self.device)
+        if not self.cap.isOpened():
+            raise Exception("无法打开摄像头")
+        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
+        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
+
+    def start(self):
+        if self.cap is None:
+            self.open()
+        self.running = True
+        super().start()
+
+    def run(self):
+        try:
+            self._read_loop()
+        finally:
+            # 设备在采集线程退出时释放，不会与仍在进行的 read() 并发
+            self._release()
+
+    def _read_loop(self):
+        cap = self.cap
+        seq = 0
+        while self.running:
+            start = time.perf_counter()
+            ret, frame = cap.read()
+            if self.stats is not None:
+                self.stats.record("capture", time.perf_counter() - start)
+            if not ret:
+                self.read_failures += 1
+                time.sleep(0.01)
+                continue
+            seq += 1
+            with self._cond:
+                self._packet = FramePacket(seq, time.monotonic(), frame)
+                self._cond.notify_all()
+
+    def latest(self):
+        """返回最新一帧，尚无帧时返回 None"""
+        return self._packet
+
+    def wait_for_frame(self, after_seq=0, timeout=1.0):
+        """等待序号大于 after_seq 的新帧，超时返回 None"""
+        with self._cond:
+            ready = self._cond.wait_for(
+                lambda: self._packet is not None and self._packet.seq > after_seq,
+                timeout=timeout,
+            )
+            return self._packet if ready else None
+
+    def _release(self):
+        with self._release_lock:
+            cap, self.cap = self.cap, None
+        if cap is not None:
+            cap.release()
+
+    def stop(self):
+        """停止采集；read() 阻塞超过 1 秒时由采集线程在退出时自行释放设备"""
+        self.running = False
+        if self.is_alive():
+            self.join(timeout=1.0)
+        elif self.ident is None:
+            # 打开后从未启动的线程没有 run() 负责释放
+            self._release()
@@ -0,0 +1,213 @@
+import threading
+import time
+
+import numpy as np
+
+from embedding_codec import decode_embeddings
+from embedding_snapshot import EmbeddingSnapshot, USER_DB_DIR, SNAPSHOT_DIR
+from user_store import ENCODING_COLUMNS, DB_ERRORS
+
+
+class ChangeFeed:
+    """基于 updated_at 水位线的用户表增量同步
+
+    每次轮询只读取水位线（减去回看窗口 overlap 秒）之后变更的行；回看窗口内
+    已应用过的行按 (工号, updated_at) 去重。删除无法通过水位线发现，改为按
+    deleted_at 水位线读取触发器写入的删除记录；首次同步与每 full_check_every 次
+    轮询仍读取全部工号核对一次，兜底处理工号被改名等触发器覆盖不到的情况。
+    """
+
+    def __init__(self, store, watermark=None, overlap=5.0, full_check_every=60,
+                 columns=ENCODING_COLUMNS):
+        self.store = store
+        self.watermark = watermark
+        self.overlap = overlap
+        self.full_check_every = full_check_every
+        self.columns = tuple(columns)
+        self.deletion_watermark = None
+        self.polls = 0
+        self._seen = {}
+        self._thread = None
+        self._stop = threading.Event()
+
+    def poll(self):
+        """返回自上次轮询以来变更的行（按 columns 排列），并推进水位线"""
+        rows = self.store.fetch_changed(self.watermark, self.columns + ("updated_at",), self.overlap)
+        changed, seen, latest = [], {}, None
+        for *row, updated_at in rows:
+            key = str(updated_at)
+            seen[row[0]] = key
+            if latest is None or updated_at > latest:
+                latest = updated_at
+            if self._seen.get(row[0]) != key:
+                changed.append(tuple(row))
+        # 下次的回看窗口不早于本次，只需记住本次读到的行
+        self._seen = seen
+        if latest is not None:
+            self.watermark = str(latest)
+        self.polls += 1
+        return changed
+
+    def find_deleted(self, known, force=False):
+        """返回 known 中已从数据库删除的工号"""
+        due = self.full_check_every and self.polls % self.full_check_every == 0
+        if force or due:
+            # 先取删除水位线再读全部工号，两次读取之间的删除下次轮询仍能读到
+            watermark = self.store.fetch_deletion_watermark()
+            deleted = set(known) - set(self.store.fetch_job_numbers())
+            self.deletion_watermark = watermark or self.deletion_watermark
+            return deleted
+        deleted, latest = set(), None
+        for job_number, deleted_at in self.store.fetch_deleted(self.deletion_watermark, self.overlap):
+            deleted.add(job_number)
+            if latest is None or deleted_at > latest:
+                latest = deleted_at
+        if latest is not None:
+            self.deletion_watermark = str(latest)
+        return deleted & set(known)
+
+    def start(self, interval, sync, on_error=None):
+        """后台线程每隔 interval 秒调用一次 sync()；数据库错误在下次轮询时重试，
+        其他异常交给 on_error(message) 报告，轮询线程不会因此退出
+        """
+        if self._thread is not None:
+            return
+
+        def loop():
+            while not self._stop.wait(interval):
+                try:
+                    sync()
+                except DB_ERRORS:
+                    pass
+                except Exception as e:
+                    if on_error:
+                        on_error(f"同步失败: {e}")
+
+        self._thread = threading.Thread(target=loop, name="ChangeFeed", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5.0)
+            self._thread = None
+
+
+class IndexSync:
+    """把用户表同步到内存分区索引与本地快照（认证窗口与识别服务共用）
+
+    本地快照是编码的唯一持久化来源：load() 映射快照并一次性加入索引，
+    index_path 只保存索引的训练结果（ivf 分区中心）。start() 做首次同步并启动 ChangeFeed 轮询。
+    on_change(changed, removed) 在同步线程中调用，参数为工号集合；
+    on_error(message) 用于报告快照写入失败等非致命错误。
+    """
+
+    def __init__(self, index, store, snapshot_dir=SNAPSHOT_DIR, user_db_dir=USER_DB_DIR,
+                 index_path=None, sync_interval=5.0, snapshot_interval=300.0,
+                 on_change=None, on_error=None):
+        self.index = index
+        self.store = store
+        self.snapshot_dir = snapshot_dir
+        self.user_db_dir = user_db_dir
+        self.index_path = index_path
+        self.sync_interval = sync_interval
+        self.snapshot_interval = snapshot_interval
+        self.on_change = on_change
+        self.on_error = on_error
+        self.feed = None
+        self.watermark = None
+        self.snapshot_dirty = False
+        self.snapshot_saved_at = time.monotonic()
+
+    def load(self):
+        """载入本地快照（没有时从 user_db 目录播种），返回快照携带的离线资料"""
+        snapshot = EmbeddingSnapshot.load(self.snapshot_dir)
+        if snapshot is None:
+            snapshot = EmbeddingSnapshot.seed_from_user_db(self.user_db_dir)
+        self.watermark = snapshot.watermark
+        if len(snapshot):
+            self.index.add_many(snapshot.job_numbers, snapshot.encodings,
+                                snapshot.statuses, snapshot.positions)
+        infos = snapshot.infos
+        snapshot.release()
+        return infos
+
+    def start(self):
+        """首次同步（含删除核对）后启动后台轮询，返回首次同步变更的用户数"""
+        self.feed = ChangeFeed(self.store, self.watermark)
+        try:
+            changed = self.sync(full_check=True)
+            self.save_snapshot()
+        finally:
+            self.feed.start(self.sync_interval, self.sync, self._report)
+        return changed
+
+    def sync(self, full_check=False):
+        """把数据库中的增量应用到内存索引，返回变更的用户数"""
+        changed_jobs, changed_encodings, statuses, positions = [], [], [], []
+        moved = set()
+        for job_number, status, position, face_encoding in self.feed.poll():
+            if face_encoding is None:
+                continue
+            # 反序列化编码集合：旧数据为无头部的单条 float64 编码，由索引转换为存储精度
+            encoding_set = decode_embeddings(face_encoding)
+            current = self.index.get(job_number)
+            if current is not None and np.array_equal(current, encoding_set.astype(current.dtype)):
+                # 回看窗口内重读的行、本终端自己注册的行与内存中一致，跳过；
+                # 只有状态或职务变化时把编码集合移到对应分区，无需重新插入
+                if self.index.profile(job_number) != (status or "", position or ""):
+                    self.index.set_status(job_number, status, position or "")
+                    moved.add(job_number)
+                continue
+            changed_jobs.extend([job_number] * len(encoding_set))
+            statuses.extend([status] * len(encoding_set))
+            positions.extend([position] * len(encoding_set))
+            changed_encodings.append(encoding_set)
+        if changed_jobs:
+            # 新注册或重新编码的用户加入索引
+            self.index.add_many(changed_jobs, np.concatenate(changed_encodings), statuses, positions)
+        # 已不在数据库里的用户需要剔除
+        stale = self.feed.find_deleted(self.index.job_numbers, force=full_check)
+        for job_number in stale:
+            self.index.remove(job_number)
+        if changed_jobs or moved or stale:
+            self.snapshot_dirty = True
+            if self.on_change:
+                self.on_change(set(changed_jobs) | moved, stale)
+        if time.monotonic() - self.snapshot_saved_at > self.snapshot_interval:
+            self.save_snapshot()
+        return len(changed_encodings) + len(moved)
+
+    def _report(self, message):
+        if self.on_error:
+            self.on_error(message)
+
+    def save_snapshot(self, force=False):
+        """索引有变化时重写本地快照（水位线取自同步进度），分区中心变化时一并写回"""
+        if self.feed is None or not (self.snapshot_dirty or force):
+            return
+        try:
+            job_numbers, encodings, statuses, positions = self.index.export()
+            EmbeddingSnapshot(job_numbers, encodings, self.feed.watermark,
+                              statuses=statuses, positions=positions).save(self.snapshot_dir)
+            self.snapshot_dirty = False
+            self.snapshot_saved_at = time.monotonic()
+        except (OSError, ValueError) as e:
+            # 快照只是本地副本，写入失败不影响识别，下次保存时重试
+            self._report(f"快照保存失败: {e}")
+        self.save_index()
+
+    def save_index(self):
+        """把索引的训练结果写回磁盘（编码只写入快照）"""
+        if self.index_path and self.index.dirty:
+            try:
+                self.index.save(self.index_path)
+            except (OSError, ValueError) as e:
+                self._report(f"索引保存失败: {e}")
+
+    def stop(self):
+        """停止轮询并写入最后一次快照"""
+        if self.feed is not None:
+            self.feed.stop()
+            self.save_snapshot()
+        self.save_index()
@@ -0,0 +1,69 @@
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+from PySide6.QtCore import QObject, QTimer
+
+
+class RenderScheduler(QObject):
+    """图表渲染节流：数据到达时只标记为脏，定时器每秒最多重绘 max_fps 次
+
+    MQTT 回调线程在 modify() 中写入数据（O(1)），界面线程的定时器发现有变化
+    才调用 render()；数据写入与渲染读取共用同一把锁，渲染时看到的是完整的一次更新。
+    消息突发时多条消息合并为一次重绘，界面不会被逐条重绘拖住。
+    """
+
+    def __init__(self, render, max_fps=10, parent=None):
+        super().__init__(parent)
+        self.render = render
+        self.lock = threading.Lock()
+        self.updates = 0
+        self.renders = 0
+        self._dirty = False
+        self.timer = QTimer(self)
+        self.timer.setInterval(max(1, int(1000 / max_fps)))
+        self.timer.timeout.connect(self._tick)
+        self.timer.start()
+
+    @contextmanager
+    def modify(self):
+        """在锁内修改图表数据并标记为脏，可在任意线程中使用"""
+        with self.lock:
+            yield
+            self._dirty = True
+            self.updates += 1
+
+    def _tick(self):
+        with self.lock:
+            if not self._dirty:
+                return
+            self._dirty = False
+            self.render()
+        self.renders += 1
+
+    def stop(self):
+        self.timer.stop()
+
+
+class AxisRange:
+    """记住坐标轴上次设置的范围，只在范围变化时调用 setRange"""
+
+    def __init__(self, axis):
+        self.axis = axis
+        self.current = None
+
+    def set(self, low, high):
+        value = (float(low), float(high))
+        if value != self.current:
+            self.axis.setRange(*value)
+            self.current = value
+
+
+def replace_series(series, x_data, y_data):
+    """用一次 replaceNp() 替换整条曲线，只触发一次重新布局
+
+    直接传入 NumPy 视图，不逐点构造 QPointF；环形缓冲区的视图本身已是连续的
+    float64，ascontiguousarray 不会复制。
+    """
+    series.replaceNp(np.ascontiguousarray(x_data, dtype=np.float64),
+                     np.ascontiguousarray(y_data, dtype=np.float64))
@@ -0,0 +1,102 @@
+import time
+
+import cv2
+import numpy as np
+
+# 画质等级：数值越大效果越完整、开销越高
+QUALITY_FULL = 2     # 动态模糊 + 边缘叠加 + 网格 + 扫描线
+QUALITY_REDUCED = 1  # 边缘在 1/4 分辨率计算，省去模糊
+QUALITY_MINIMAL = 0  # 仅网格与扫描线
+
+
+class CyberEffectRenderer:
+    """赛博朋克风格预览渲染管线
+
+    在控件分辨率上渲染，网格叠加层按尺寸预渲染缓存，边缘检测在低分辨率上计算后放大。
+    每帧统计耗时，平均耗时超出预算时自动降级，持续低于预算一半时再逐级恢复。
+    """
+
+    def __init__(self, budget_ms=12.0, scan_speed=3, grid_color=(0, 255, 255)):
+        self.budget_ms = budget_ms
+        self.scan_speed = scan_speed
+        self.scan_alpha = 0.0
+        self.grid_color = grid_color
+        self.quality = QUALITY_FULL
+        self.avg_cost_ms = 0.0
+        self.recover_frames = 30
+        self._fast_frames = 0
+        self._grid_cache = {}
+        self._buffers = {}
+
+    def grid_mask(self, w, h):
+        """三分网格线掩码，每个尺寸只生成一次"""
+        mask = self._grid_cache.get((w, h))
+        if mask is None:
+            canvas = np.zeros((h, w), dtype=np.uint8)
+            for i in range(1, 3):
+                cv2.line(canvas, (w // 3 * i, 0), (w // 3 * i, h), 255, 1)
+                cv2.line(canvas, (0, h // 3 * i), (w, h // 3 * i), 255, 1)
+            mask = canvas.astype(bool)
+            self._grid_cache = {(w, h): mask}
+        return mask
+
+    def _buffer(self, name, shape, dtype=np.uint8):
+        """按名称复用中间缓冲区，尺寸变化时才重新分配"""
+        buf = self._buffers.get(name)
+        if buf is None or buf.shape != shape:
+            buf = np.empty(shape, dtype=dtype)
+            self._buffers[name] = buf
+        return buf
+
+    def render(self, frame):
+        """在 frame 上原地叠加特效（frame 为显示控件已缩放好的缓冲区）"""
+        start = time.perf_counter()
+        h, w = frame.shape[:2]
+
+        if self.quality >= QUALITY_FULL:
+            # 动态模糊效果
+            kernel_size = int(5 * abs(np.sin(np.radians(self.scan_alpha))))
+            kernel_size = kernel_size + 1 if kernel_size % 2 == 0 else kernel_size
+            blurred = self._buffer("blur", frame.shape)
+            cv2.GaussianBlur(frame, (kernel_size, kernel_size), 0, dst=blurred)
+            cv2.addWeighted(frame, 0.7, blurred, 0.3, 0, dst=frame)
+
+        # 网格效果（预渲染掩码）
+        frame[self.grid_mask(w, h)] = self.grid_color
+
+        # 扫描线动画
+        self.scan_alpha = (self.scan_alpha + self.scan_speed) % 360
+        scan_pos = int((np.sin(np.radians(self.scan_alpha)) + 1) * h / 2)
+        cv2.line(frame, (0, scan_pos), (w, scan_pos), (100, 255, 255), 2)
+
+        if self.quality >= QUALITY_REDUCED:
+            # 边缘检测：低分辨率计算后放大叠加
+            factor = 2 if self.quality >= QUALITY_FULL else 4
+            sw, sh = max(1, w // factor), max(1, h // factor)
+            small = self._buffer("edge_small", (sh, sw, 3))
+            cv2.resize(frame, (sw, sh), dst=small, interpolation=cv2.INTER_AREA)
+            edges = cv2.Canny(small, 100, 200)
+            edges_full = self._buffer("edge_full", (h, w))
+            cv2.resize(edges, (w, h), dst=edges_full, interpolation=cv2.INTER_NEAREST)
+            edges_bgr = self._buffer("edge_bgr", frame.shape)
+            cv2.cvtColor(edges_full, cv2.COLOR_GRAY2BGR, dst=edges_bgr)
+            cv2.addWeighted(frame, 0.9, edges_bgr, 0.1, 0, dst=frame)
+
+        self._account((time.perf_counter() - start) * 1000.0)
+        return frame
+
+    def _account(self, cost_ms):
+        """更新平均耗时并按预算调整画质"""
+        self.avg_cost_ms = 0.8 * self.avg_cost_ms + 0.2 * cost_ms if self.avg_cost_ms else cost_ms
+        if self.avg_cost_ms > self.budget_ms and self.quality > QUALITY_MINIMAL:
+            self.quality -= 1
+            self._fast_frames = 0
+            self.avg_cost_ms = 0.0
+        elif self.avg_cost_ms < self.budget_ms * 0.5 and self.quality < QUALITY_FULL:
+            self._fast_frames += 1
+            if self._fast_frames >= self.recover_frames:
+                self.quality += 1
+                self._fast_frames = 0
+                self.avg_cost_ms = 0.0
+        else:
+            self._fast_frames = 0
@@ -0,0 +1,85 @@
+import time
+
+import cv2
+import numpy as np
+from PyQt6.QtWidgets import QLabel
+from PyQt6.QtGui import QImage, QPainter
+
+
+class VideoSurface(QLabel):
+    """预览画面控件：复用预分配缓冲区，直接绘制 QImage
+
+    帧先缩放进目标尺寸的 BGR 缓冲区（可原地叠加特效），再转换进 RGB 缓冲区，
+    QImage 直接引用该缓冲区并在 paintEvent 中绘制，稳定后每帧不再分配图像内存。
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._bgr = None
+        self._rgb = None
+        self._image = None
+        self.allocations = 0
+        self.frames = 0
+        self.last_frame_allocations = 0
+        # 可选的 PerfStats，记录 RGB 转换与绘制耗时
+        self.stats = None
+
+    @property
+    def allocations_per_frame(self):
+        return self.allocations / self.frames if self.frames else 0.0
+
+    def target_size(self, frame_shape):
+        """按比例缩放到控件内，返回 (宽, 高)"""
+        h, w = frame_shape[:2]
+        ratio = min(self.width() / w, self.height() / h)
+        if ratio <= 0:
+            return w, h
+        return max(1, int(w * ratio)), max(1, int(h * ratio))
+
+    def _ensure_buffers(self, w, h):
+        if self._bgr is not None and self._bgr.shape[:2] == (h, w):
+            return
+        self._bgr = np.empty((h, w, 3), dtype=np.uint8)
+        self._rgb = np.empty((h, w, 3), dtype=np.uint8)
+        self._image = QImage(self._rgb.data, w, h, w * 3, QImage.Format.Format_RGB888)
+        self.allocations += 2
+        self.last_frame_allocations += 2
+
+    def scale_into(self, frame, smooth=True):
+        """把帧缩放进本控件持有的 BGR 缓冲区并返回该缓冲区
+
+        smooth 为 False 时使用最近邻插值，适合识别任务繁忙时降低开销。
+        """
+        self.last_frame_allocations = 0
+        w, h = self.target_size(frame.shape)
+        self._ensure_buffers(w, h)
+        if smooth:
+            interpolation = cv2.INTER_AREA if w < frame.shape[1] else cv2.INTER_LINEAR
+        else:
+            interpolation = cv2.INTER_NEAREST
+        cv2.resize(frame, (w, h), dst=self._bgr, interpolation=interpolation)
+        return self._bgr
+
+    def present(self, bgr):
+        """把 BGR 图像转换进 RGB 缓冲区并请求重绘"""
+        h, w = bgr.shape[:2]
+        self._ensure_buffers(w, h)
+        start = time.perf_counter()
+        cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB, dst=self._rgb)
+        if self.stats is not None:
+            self.stats.record("convert", time.perf_counter() - start)
+        self.frames += 1
+        self.update()
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if self._image is None:
+            return
+        start = time.perf_counter()
+        painter = QPainter(self)
+        x = (self.width() - self._image.width()) // 2
+        y = (self.height() - self._image.height()) // 2
+        painter.drawImage(x, y, self._image)
+        painter.end()
+        if self.stats is not None:
+            self.stats.record("paint", time.perf_counter() - start)
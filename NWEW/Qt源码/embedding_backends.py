@@ -0,0 +1,192 @@
+"""人脸编码后端与一致性检查
+
+编码后端把一批对齐后的人脸裁剪图（150×150 RGB）一次编码为 (N, 128) 矩阵：
+dlib 为 face_recognition 自带的 ResNet；onnx 为同一网络转换为 ONNX 后在
+onnxruntime CPU 上推理（可选依赖）。对齐统一用 dlib 5 点特征点完成，与
+face_recognition.face_encodings 内部的做法一致。
+
+切换到其他后端之前，先用一批照片检查其编码与 dlib（即库中已存 face_encoding）
+的距离，超过 COMPATIBLE_DISTANCE 时不能与已有用户混用。
+
+示例：
+    python embedding_backends.py photos/ --backend onnx
+    python embedding_backends.py photos/ --backend onnx --model my_resnet.onnx --limit 200
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+from embedding_codec import EMBEDDING_DIM
+from face_detectors import MODEL_DIR
+from model_loader import models
+
+CHIP_SIZE = 150
+CHIP_PADDING = 0.25
+# dlib 人脸识别网络输入的各通道均值（RGB）；像素减去均值后除以 256
+DLIB_MEAN = (122.782, 117.001, 104.298)
+# 与库中编码兼容的最大距离，远小于匹配阈值 0.4
+COMPATIBLE_DISTANCE = 0.06
+
+
+class FaceAligner:
+    """按 5 点特征点把人脸框对齐裁剪为 size×size 的图像"""
+
+    def __init__(self, size=CHIP_SIZE, padding=CHIP_PADDING):
+        self.size = size
+        self.padding = padding
+
+    def align(self, rgb, boxes):
+        import dlib
+
+        api = models.face_recognition.api
+        chips = []
+        for top, right, bottom, left in boxes:
+            shape = api.pose_predictor_5_point(rgb, dlib.rectangle(left, top, right, bottom))
+            chips.append(dlib.get_face_chip(rgb, shape, size=self.size, padding=self.padding))
+        return chips
+
+
+class DlibEmbedding:
+    """face_recognition 自带的 dlib ResNet，一次调用编码整批裁剪图"""
+
+    name = "dlib"
+
+    def __init__(self, num_jitters=0, aligner=None):
+        self.num_jitters = num_jitters
+        self.aligner = aligner or FaceAligner()
+
+    def encode_crops(self, crops):
+        if not len(crops):
+            return np.zeros((0, EMBEDDING_DIM))
+        encoder = models.face_recognition.api.face_encoder
+        return np.array(encoder.compute_face_descriptor(list(crops), self.num_jitters))
+
+    def encode(self, rgb, boxes):
+        """对一帧中的多个人脸框批量编码"""
+        return self.encode_crops(self.aligner.align(rgb, boxes))
+
+
+class OnnxEmbedding:
+    """ONNX 格式的 dlib ResNet，在 onnxruntime CPU 上批量推理
+
+    模型输入为 NCHW 或 NHWC 的 float32 批次（按输入形状自动判断），
+    预处理与 dlib 相同：RGB 像素减去 mean 后乘以 scale。
+    """
+
+    name = "onnx"
+
+    def __init__(self, model_path=None, threads=0, mean=DLIB_MEAN, scale=1 / 256.0, aligner=None):
+        # 只有选用 onnx 后端时才导入，dlib 后端的进程不必加载 onnxruntime
+        try:
+            import onnxruntime
+        except ImportError:
+            raise RuntimeError("未安装 onnxruntime") from None
+        model_path = model_path or os.path.join(MODEL_DIR, "dlib_face_recognition_resnet_model_v1.onnx")
+        if not os.path.exists(model_path):
+            raise OSError(f"缺少 ONNX 模型文件: {model_path}")
+        options = onnxruntime.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(
+            model_path, options, providers=["CPUExecutionProvider"])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.channels_first = len(model_input.shape) == 4 and model_input.shape[1] == 3
+        self.mean = np.asarray(mean, dtype=np.float32)
+        self.scale = np.float32(scale)
+        self.aligner = aligner or FaceAligner()
+
+    def encode_crops(self, crops):
+        if not len(crops):
+            return np.zeros((0, EMBEDDING_DIM))
+        batch = (np.asarray(crops, dtype=np.float32) - self.mean) * self.scale
+        if self.channels_first:
+            batch = batch.transpose(0, 3, 1, 2)
+        output = self.session.run(None, {self.input_name: np.ascontiguousarray(batch)})[0]
+        return output.reshape(len(crops), -1).astype(np.float64)
+
+    def encode(self, rgb, boxes):
+        return self.encode_crops(self.aligner.align(rgb, boxes))
+
+
+EMBEDDING_BACKENDS = {
+    "dlib": DlibEmbedding,
+    "onnx": OnnxEmbedding,
+}
+
+
+def create_embedding_backend(name="dlib", **options):
+    if name not in EMBEDDING_BACKENDS:
+        raise ValueError(f"未知的编码后端: {name}")
+    return EMBEDDING_BACKENDS[name](**options)
+
+
+def check_consistency(backend, crops, reference=None, max_distance=COMPATIBLE_DISTANCE):
+    """同一批裁剪图分别用 backend 与参考后端（默认 dlib）编码，比较两者的距离"""
+    reference = reference or DlibEmbedding()
+    expected = reference.encode_crops(crops)
+    actual = backend.encode_crops(crops)
+    if actual.shape != expected.shape:
+        return {"compatible": False, "crops": len(crops),
+                "reason": f"编码形状 {actual.shape} 与参考 {expected.shape} 不同"}
+    distances = np.linalg.norm(actual - expected, axis=1)
+    return {
+        "compatible": bool(len(distances)) and bool(distances.max() <= max_distance),
+        "crops": len(crops),
+        "mean_distance": round(float(distances.mean()), 5) if len(distances) else None,
+        "max_distance": round(float(distances.max()), 5) if len(distances) else None,
+    }
+
+
+def load_crops(photo_dir, limit=100):
+    """从照片目录（可含子目录）取每张照片中最大的人脸并对齐"""
+    face_recognition = models.face_recognition
+    aligner = FaceAligner()
+    crops = []
+    for root, _, names in os.walk(photo_dir):
+        for name in sorted(names):
+            if not name.lower().endswith((".jpg", ".jpeg", ".png", ".bmp")):
+                continue
+            try:
+                image = face_recognition.load_image_file(os.path.join(root, name))
+            except (OSError, ValueError):
+                continue
+            locations = face_recognition.face_locations(image)
+            if locations:
+                largest = max(locations, key=lambda b: (b[1] - b[3]) * (b[2] - b[0]))
+                crops.extend(aligner.align(image, [largest]))
+            if len(crops) >= limit:
+                return crops
+    return crops
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="检查编码后端与库中 dlib 编码的一致性")
+    parser.add_argument("photos", help="照片目录")
+    parser.add_argument("--backend", default="onnx", choices=sorted(EMBEDDING_BACKENDS))
+    parser.add_argument("--model", help="ONNX 模型文件，默认 user_db/models 下的 dlib ResNet")
+    parser.add_argument("--limit", type=int, default=100, help="最多使用的人脸数")
+    parser.add_argument("--max-distance", type=float, default=COMPATIBLE_DISTANCE)
+    args = parser.parse_args(argv)
+
+    options = {"model_path": args.model} if args.backend == "onnx" and args.model else {}
+    backend = create_embedding_backend(args.backend, **options)
+    crops = load_crops(args.photos, args.limit)
+    if not crops:
+        print("照片中没有检测到人脸", file=sys.stderr)
+        return 1
+    result = check_consistency(backend, crops, max_distance=args.max_distance)
+    for candidate in (DlibEmbedding(), backend):
+        start = time.perf_counter()
+        candidate.encode_crops(crops)
+        elapsed = (time.perf_counter() - start) * 1000.0 / len(crops)
+        print(f"{candidate.name:>5}: 每张 {elapsed:.2f} ms（批量 {len(crops)} 张）")
+    print(result)
+    return 0 if result["compatible"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,48 @@
+import struct
+
+import numpy as np
+
+EMBEDDING_DIM = 128
+# 编码的默认存储与计算精度；float16 仅用于存储，计算时分块提升为 float32
+STORAGE_DTYPE = np.float32
+
+# BLOB 格式：4 字节魔数 + 1 字节类型码 + 1 字节保留 + 2 字节维度（小端），其后为 K×dim 数组
+# 旧数据没有头部，是裸的 float64 数组
+MAGIC = b"FEMB"
+HEADER = struct.Struct("<4scxH")
+DTYPE_CODES = {b"e": np.float16, b"f": np.float32, b"d": np.float64}
+
+
+def dtype_code(dtype):
+    dtype = np.dtype(dtype)
+    for code, candidate in DTYPE_CODES.items():
+        if np.dtype(candidate) == dtype:
+            return code
+    raise ValueError(f"不支持的编码精度: {dtype}")
+
+
+def encode_embeddings(encodings, dtype=STORAGE_DTYPE):
+    """把 (K, dim) 编码集合序列化为带头部的 BLOB"""
+    block = np.asarray(encodings, dtype=np.dtype(dtype).newbyteorder("<"))
+    block = block.reshape(-1, block.shape[-1])
+    return HEADER.pack(MAGIC, dtype_code(dtype), block.shape[1]) + block.tobytes()
+
+
+def is_legacy(blob):
+    """是否为旧版无头部的 float64 BLOB"""
+    return bytes(blob[:4]) != MAGIC
+
+
+def decode_embeddings(blob, dim=EMBEDDING_DIM):
+    """解析 BLOB，返回存储精度下的 (K, dim) 只读数组；兼容旧版 float64 BLOB"""
+    if is_legacy(blob):
+        return np.frombuffer(blob, dtype=np.float64).reshape(-1, dim)
+    _, code, stored_dim = HEADER.unpack_from(blob)
+    dtype = np.dtype(DTYPE_CODES[code]).newbyteorder("<")
+    return np.frombuffer(blob, dtype=dtype, offset=HEADER.size).reshape(-1, stored_dim)
+
+
+def compute_dtype(dtype):
+    """距离计算使用的精度：float16 在 CPU 上没有 BLAS 支持，提升为 float32"""
+    dtype = np.dtype(dtype)
+    return np.dtype(np.float32) if dtype == np.float16 else dtype
@@ -0,0 +1,120 @@
+import json
+import os
+
+import numpy as np
+
+from embedding_codec import EMBEDDING_DIM, STORAGE_DTYPE
+
+SNAPSHOT_VERSION = 2
+
+USER_DB_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "user_db")
+SNAPSHOT_DIR = os.path.join(USER_DB_DIR, "snapshot")
+
+
+class EmbeddingSnapshot:
+    """人脸编码快照
+
+    目录结构：
+        encodings.npy    所有编码组成的连续矩阵 (N, 128)，float32/float16，启动时以 mmap 方式打开
+        job_numbers.npy  与矩阵行一一对应的工号（一位用户的编码集合占多行，工号重复）
+        statuses.npy     每行对应用户的状态，用于分区索引
+        positions.npy    每行对应用户的职务
+        meta.json        格式版本、行数与数据库水位线（快照覆盖到的最大 updated_at）
+    meta.json 最后写入，作为快照完整的标记。
+    """
+
+    def __init__(self, job_numbers, encodings, watermark=None, infos=None, statuses=None, positions=None):
+        self.job_numbers = list(job_numbers)
+        self.encodings = encodings
+        self.watermark = watermark
+        self.statuses = list(statuses) if statuses is not None else ["在职"] * len(self.job_numbers)
+        self.positions = list(positions) if positions is not None else [""] * len(self.job_numbers)
+        # 仅从 user_db 目录播种时携带用户信息，供数据库不可用时离线认证
+        self.infos = infos or {}
+
+    def __len__(self):
+        return len(self.job_numbers)
+
+    def release(self):
+        """释放内存映射（Windows 下被映射的文件无法被替换）"""
+        self.encodings = None
+
+    @classmethod
+    def load(cls, directory):
+        """以内存映射方式打开快照；不存在或版本不符时返回 None"""
+        meta_path = os.path.join(directory, "meta.json")
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("version") != SNAPSHOT_VERSION:
+                return None
+            encodings = np.load(os.path.join(directory, "encodings.npy"), mmap_mode="r")
+            job_numbers = np.load(os.path.join(directory, "job_numbers.npy"), allow_pickle=False)
+            statuses = np.load(os.path.join(directory, "statuses.npy"), allow_pickle=False)
+            positions = np.load(os.path.join(directory, "positions.npy"), allow_pickle=False)
+        except (OSError, ValueError):
+            return None
+        count = meta["count"]
+        if not len(job_numbers) == len(statuses) == len(positions) == encodings.shape[0] == count:
+            return None
+        return cls([str(j) for j in job_numbers], encodings, meta.get("watermark"),
+                   statuses=[str(s) for s in statuses], positions=[str(p) for p in positions])
+
+    def save(self, directory):
+        """写入快照：各文件先写临时文件再替换，meta.json 最后落盘"""
+        os.makedirs(directory, exist_ok=True)
+        meta_path = os.path.join(directory, "meta.json")
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+        encodings = np.asarray(self.encodings)
+        if encodings.dtype == np.float64:
+            encodings = encodings.astype(STORAGE_DTYPE)
+        # 空快照无法用 -1 推断列数，按已知维度整形
+        dim = encodings.shape[1] if encodings.ndim == 2 else EMBEDDING_DIM
+        encodings = np.ascontiguousarray(encodings).reshape(len(self), dim)
+        self._replace(directory, "encodings.npy", encodings)
+        self._replace(directory, "job_numbers.npy", np.array(self.job_numbers, dtype=str))
+        self._replace(directory, "statuses.npy", np.array(self.statuses, dtype=str))
+        self._replace(directory, "positions.npy", np.array(self.positions, dtype=str))
+        meta = {
+            "version": SNAPSHOT_VERSION,
+            "count": len(self),
+            "dim": dim,
+            "dtype": encodings.dtype.name,
+            "watermark": self.watermark,
+        }
+        with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(meta_path + ".tmp", meta_path)
+
+    @staticmethod
+    def _replace(directory, name, array):
+        path = os.path.join(directory, name)
+        with open(path + ".tmp", "wb") as f:
+            np.save(f, array)
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def seed_from_user_db(cls, user_db_dir, dim=128):
+        """从 user_db/<工号>/encoding.npy + info.json 目录结构生成快照（无水位线）"""
+        job_numbers, encodings, infos, statuses, positions = [], [], {}, [], []
+        if os.path.isdir(user_db_dir):
+            for entry in sorted(os.listdir(user_db_dir)):
+                encoding_path = os.path.join(user_db_dir, entry, "encoding.npy")
+                info_path = os.path.join(user_db_dir, entry, "info.json")
+                if not (os.path.isfile(encoding_path) and os.path.isfile(info_path)):
+                    continue
+                try:
+                    with open(info_path, "r", encoding="utf-8") as f:
+                        info = json.load(f)
+                    encoding_set = np.load(encoding_path).astype(STORAGE_DTYPE).reshape(-1, dim)
+                except (OSError, ValueError):
+                    continue
+                job_number = str(info.get("job_number", entry))
+                job_numbers.extend([job_number] * len(encoding_set))
+                statuses.extend([info.get("status", "在职")] * len(encoding_set))
+                positions.extend([info.get("position", "")] * len(encoding_set))
+                encodings.append(encoding_set)
+                infos[job_number] = info
+        matrix = np.concatenate(encodings) if encodings else np.zeros((0, dim), dtype=STORAGE_DTYPE)
+        return cls(job_numbers, matrix, None, infos, statuses, positions)
@@ -0,0 +1,203 @@
+import json
+import os
+import platform
+import time
+
+import cv2
+import numpy as np
+
+from face_tracker import box_iou
+from model_loader import models
+from embedding_snapshot import USER_DB_DIR
+
+MODEL_DIR = os.path.join(USER_DB_DIR, "models")
+CALIBRATION_PATH = os.path.join(USER_DB_DIR, "detector_calibration.json")
+# 校准时作为“真值”的检测器，按准确度从高到低取第一个可用的
+REFERENCE_ORDER = ("cnn", "dnn", "hog")
+
+
+class DlibDetector:
+    """face_recognition 自带的 dlib 检测器：hog（CPU 快）或 cnn（准确，CPU 上很慢）"""
+
+    def __init__(self, model="hog", upsample=1):
+        self.model = model
+        self.upsample = upsample
+
+    def detect(self, rgb):
+        return models.face_recognition.face_locations(
+            rgb, number_of_times_to_upsample=self.upsample, model=self.model)
+
+
+class HaarDetector:
+    """OpenCV Haar 级联，模型随 opencv-python 发布"""
+
+    def __init__(self, cascade=None, scale_factor=1.1, min_neighbors=5, min_size=30):
+        if cascade is None:
+            cascade = os.path.join(cv2.data.haarcascades, "haarcascade_frontalface_default.xml")
+        self.classifier = cv2.CascadeClassifier(cascade)
+        if self.classifier.empty():
+            raise OSError(f"无法加载 Haar 模型: {cascade}")
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.min_size = min_size
+
+    def detect(self, rgb):
+        gray = cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY)
+        faces = self.classifier.detectMultiScale(
+            gray, self.scale_factor, self.min_neighbors, minSize=(self.min_size, self.min_size))
+        return [(int(y), int(x + w), int(y + h), int(x)) for x, y, w, h in faces]
+
+
+class DnnDetector:
+    """OpenCV DNN 的 res10 SSD 人脸检测器，模型文件需放在 user_db/models 下"""
+
+    def __init__(self, prototxt=None, weights=None, confidence=0.6, input_size=300):
+        prototxt = prototxt or os.path.join(MODEL_DIR, "deploy.prototxt")
+        weights = weights or os.path.join(MODEL_DIR, "res10_300x300_ssd_iter_140000.caffemodel")
+        if not (os.path.exists(prototxt) and os.path.exists(weights)):
+            raise OSError(f"缺少 DNN 模型文件: {prototxt}, {weights}")
+        self.net = cv2.dnn.readNetFromCaffe(prototxt, weights)
+        self.confidence = confidence
+        self.input_size = input_size
+
+    def detect(self, rgb):
+        h, w = rgb.shape[:2]
+        # 模型按 BGR 训练，swapRB 把 RGB 输入换回 BGR
+        blob = cv2.dnn.blobFromImage(rgb, 1.0, (self.input_size, self.input_size),
+                                     (104.0, 177.0, 123.0), swapRB=True)
+        self.net.setInput(blob)
+        detections = self.net.forward()[0, 0]
+        boxes = []
+        for _, _, score, x0, y0, x1, y1 in detections:
+            if score < self.confidence:
+                continue
+            left, top = max(0, int(x0 * w)), max(0, int(y0 * h))
+            right, bottom = min(w, int(x1 * w)), min(h, int(y1 * h))
+            if right > left and bottom > top:
+                boxes.append((top, right, bottom, left))
+        return boxes
+
+
+DETECTORS = {
+    "hog": lambda **kw: DlibDetector("hog", **kw),
+    "cnn": lambda **kw: DlibDetector("cnn", **kw),
+    "haar": lambda **kw: HaarDetector(**kw),
+    "dnn": lambda **kw: DnnDetector(**kw),
+}
+
+
+# 依赖 face_recognition/dlib 的检测器；进程池模式下界面进程不应加载它们
+DLIB_DETECTORS = ("hog", "cnn")
+
+
+def register_detector(name, factory):
+    """注册自定义检测器；factory(**options) 返回带 detect(rgb) 方法的对象"""
+    DETECTORS[name] = factory
+
+
+def create_detector(name="hog", **options):
+    if name not in DETECTORS:
+        raise ValueError(f"未知的检测器: {name}")
+    return DETECTORS[name](**options)
+
+
+def available_detectors(names=None):
+    """返回 {名称: 检测器}，模型文件缺失或依赖不可用的跳过"""
+    detectors = {}
+    for name in names or DETECTORS:
+        try:
+            detectors[name] = create_detector(name)
+        except (OSError, RuntimeError, AttributeError, cv2.error):
+            continue
+    return detectors
+
+
+def machine_key():
+    """区分终端的机器标识：主机名加 CPU 架构"""
+    return f"{platform.node()}/{platform.machine()}"
+
+
+def recall(found, expected, min_iou=0.4):
+    """expected 中被 found 以不低于 min_iou 的交并比命中的比例"""
+    if not expected:
+        return 1.0
+    remaining = list(found)
+    hits = 0
+    for box in expected:
+        best = max(remaining, key=lambda b: box_iou(b, box), default=None)
+        if best is not None and box_iou(best, box) >= min_iou:
+            remaining.remove(best)
+            hits += 1
+    return hits / len(expected)
+
+
+def calibrate(frames, min_recall=0.9, names=None, min_faces=5):
+    """在样本帧（RGB）上测量各检测器的耗时与召回，返回 (最佳检测器名, 各项结果)
+
+    召回以 REFERENCE_ORDER 中第一个可用检测器的结果为准；参考检测器在样本中
+    找到的人脸少于 min_faces 张时无法判断，返回 (None, 结果)。
+    参考检测器每帧只运行一次，其耗时直接作为它自己的测量结果。
+    """
+    detectors = available_detectors(names)
+    reference = next((name for name in REFERENCE_ORDER if name in detectors), None)
+    if reference is None:
+        return None, {}
+    expected, reference_times = [], []
+    for rgb in frames:
+        start = time.perf_counter()
+        expected.append(detectors[reference].detect(rgb))
+        reference_times.append(time.perf_counter() - start)
+    results = {}
+    if sum(len(boxes) for boxes in expected) < min_faces:
+        return None, results
+    results[reference] = {
+        "median_ms": round(float(np.median(reference_times)) * 1000.0, 3),
+        "recall": 1.0,
+    }
+    for name, detector in detectors.items():
+        if name == reference:
+            continue
+        times, recalls = [], []
+        for rgb, boxes in zip(frames, expected):
+            start = time.perf_counter()
+            found = detector.detect(rgb)
+            times.append(time.perf_counter() - start)
+            if boxes:
+                recalls.append(recall(found, boxes))
+        results[name] = {
+            "median_ms": round(float(np.median(times)) * 1000.0, 3),
+            "recall": round(float(np.mean(recalls)), 4),
+        }
+    qualified = [name for name, r in results.items() if r["recall"] >= min_recall]
+    best = min(qualified, key=lambda name: results[name]["median_ms"]) if qualified else reference
+    return best, results
+
+
+def load_choice(path=CALIBRATION_PATH):
+    """返回本机已校准的检测器名，未校准时返回 None"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            entry = json.load(f).get(machine_key())
+    except (OSError, ValueError):
+        return None
+    if entry and entry.get("detector") in DETECTORS:
+        return entry["detector"]
+    return None
+
+
+def save_choice(detector, results, path=CALIBRATION_PATH):
+    """按机器写入校准结果；同一文件可被多台终端共用"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            choices = json.load(f)
+    except (OSError, ValueError):
+        choices = {}
+    choices[machine_key()] = {
+        "detector": detector,
+        "results": results,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(choices, f, ensure_ascii=False, indent=2)
+    os.replace(path + ".tmp", path)
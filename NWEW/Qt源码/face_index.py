@@ -0,0 +1,193 @@
+import threading
+from collections import namedtuple
+
+import numpy as np
+
+from embedding_codec import STORAGE_DTYPE, compute_dtype
+
+# 一帧中单张人脸的识别结果；未匹配时 job_number 与 distance 为 None
+FaceMatch = namedtuple("FaceMatch", ["track_id", "box", "job_number", "distance"])
+
+
+class EmbeddingIndex:
+    """人脸特征索引：所有注册编码保存在一个连续的 NumPy 矩阵中
+
+    每位用户可以有多条编码（注册时保留的最佳若干帧），各占矩阵一行；
+    匹配时对所有行做一次矩阵运算，用户距离取其编码集合中的最小值。
+    矩阵按 dtype 存储（默认 float32），距离在同一精度下计算；
+    float16 存储时按 chunk_rows 分块提升为 float32 再计算。
+    """
+
+    def __init__(self, dim=128, capacity=1024, dtype=STORAGE_DTYPE, chunk_rows=8192):
+        self.dim = dim
+        self.dtype = np.dtype(dtype)
+        self.chunk_rows = chunk_rows
+        self._compute = compute_dtype(self.dtype)
+        self._matrix = np.zeros((capacity, dim), dtype=self.dtype)
+        self._sq_norms = np.zeros(capacity, dtype=self._compute)
+        self._owners = []
+        self._rows = {}
+        # 单个用户最多占用的行数，用于 top-k 按用户去重时确定候选行数
+        self._max_set = 1
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, job_number):
+        return job_number in self._rows
+
+    @property
+    def job_numbers(self):
+        return list(self._rows)
+
+    @property
+    def row_count(self):
+        return len(self._owners)
+
+    def _grow(self, min_capacity):
+        """容量不足时按倍数扩容，保证矩阵始终连续"""
+        capacity = max(min_capacity, self._matrix.shape[0] * 2)
+        matrix = np.zeros((capacity, self.dim), dtype=self._matrix.dtype)
+        sq_norms = np.zeros(capacity, dtype=self._sq_norms.dtype)
+        size = len(self._owners)
+        matrix[:size] = self._matrix[:size]
+        sq_norms[:size] = self._sq_norms[:size]
+        self._matrix = matrix
+        self._sq_norms = sq_norms
+
+    def _append(self, owners, block):
+        """把一块编码整体拷贝到矩阵末尾"""
+        start = len(self._owners)
+        end = start + len(owners)
+        if end > self._matrix.shape[0]:
+            self._grow(end)
+        self._matrix[start:end] = block
+        # 范数按存储后的值计算，与距离计算所见的数据一致
+        stored = self._matrix[start:end].astype(self._compute, copy=False)
+        self._sq_norms[start:end] = np.einsum("ij,ij->i", stored, stored)
+        for row, job_number in enumerate(owners, start):
+            rows = self._rows.setdefault(job_number, [])
+            rows.append(row)
+            self._max_set = max(self._max_set, len(rows))
+            self._owners.append(job_number)
+
+    def _delete(self, job_number):
+        """删除用户的所有行：从大到小用最后一行填补空位，保持矩阵紧凑"""
+        rows = self._rows.pop(job_number, None)
+        if rows is None:
+            return False
+        for row in sorted(rows, reverse=True):
+            last = len(self._owners) - 1
+            if row != last:
+                moved = self._owners[last]
+                self._matrix[row] = self._matrix[last]
+                self._sq_norms[row] = self._sq_norms[last]
+                self._owners[row] = moved
+                moved_rows = self._rows[moved]
+                moved_rows[moved_rows.index(last)] = row
+            self._owners.pop()
+        return True
+
+    def add(self, job_number, encodings):
+        """原地插入或替换一个用户的编码（单条或多条），无需重建索引"""
+        block = np.asarray(encodings, dtype=self._matrix.dtype).reshape(-1, self.dim)
+        with self._lock:
+            self._delete(job_number)
+            self._append([job_number] * len(block), block)
+
+    def add_many(self, job_numbers, encodings):
+        """批量插入：job_numbers 与编码逐行对应，同一工号的多行组成该用户的编码集合"""
+        encodings = np.asarray(encodings, dtype=self._matrix.dtype).reshape(-1, self.dim)
+        groups = {}
+        for i, job_number in enumerate(job_numbers):
+            groups.setdefault(job_number, []).append(i)
+        order = [i for indices in groups.values() for i in indices]
+        with self._lock:
+            for job_number in groups:
+                self._delete(job_number)
+            self._append([job_numbers[i] for i in order], encodings[order])
+
+    def get(self, job_number):
+        """返回用户的编码集合 (K, dim)，不存在时返回 None"""
+        with self._lock:
+            rows = self._rows.get(job_number)
+            return None if rows is None else self._matrix[rows].copy()
+
+    def export(self):
+        """返回 (每行工号, 编码矩阵副本)，行顺序一致"""
+        with self._lock:
+            size = len(self._owners)
+            return list(self._owners), self._matrix[:size].copy()
+
+    def remove(self, job_number):
+        with self._lock:
+            return self._delete(job_number)
+
+    def _row_distances(self, queries):
+        """查询 (m, dim) 到所有编码行的距离矩阵 (m, n)，调用方需持有锁"""
+        size = len(self._owners)
+        matrix = self._matrix[:size]
+        if matrix.dtype == self._compute:
+            products = queries @ matrix.T
+        else:
+            products = np.empty((len(queries), size), dtype=self._compute)
+            for start in range(0, size, self.chunk_rows):
+                chunk = matrix[start:start + self.chunk_rows].astype(self._compute)
+                products[:, start:start + len(chunk)] = queries @ chunk.T
+        sq = (self._sq_norms[:size][None, :]
+              - 2 * products
+              + np.einsum("ij,ij->i", queries, queries)[:, None])
+        return np.sqrt(np.maximum(sq, 0, out=sq), out=sq)
+
+    def _queries(self, encodings):
+        return np.asarray(encodings, dtype=self._compute).reshape(-1, self.dim)
+
+    def distances(self, encoding):
+        """一次矩阵运算计算查询编码到所有编码行的欧氏距离，返回 (每行工号, 距离)"""
+        with self._lock:
+            return list(self._owners), self._row_distances(self._queries(encoding))[0]
+
+    def search(self, encoding, k=1):
+        """返回距离最近的 k 位用户 (工号, 距离)，按距离升序"""
+        query = self._queries(encoding)
+        with self._lock:
+            if not self._owners:
+                return []
+            dists = self._row_distances(query)[0]
+            # 每位用户可能占多行，先取足够多的最近行再按用户去重
+            m = min(len(dists), k * self._max_set)
+            if m < len(dists):
+                top = np.argpartition(dists, m - 1)[:m]
+            else:
+                top = np.arange(len(dists))
+            results, seen = [], set()
+            for i in top[np.argsort(dists[top])]:
+                owner = self._owners[i]
+                if owner not in seen:
+                    seen.add(owner)
+                    results.append((owner, float(dists[i])))
+                    if len(results) == k:
+                        break
+            return results
+
+    def match(self, encoding, tolerance=0.4):
+        """返回最近且距离不超过阈值的 (工号, 距离)，否则返回 None"""
+        best = self.search(encoding, k=1)
+        if best and best[0][1] <= tolerance:
+            return best[0]
+        return None
+
+    def match_batch(self, encodings, tolerance=0.4):
+        """批量匹配：所有查询一次矩阵乘法，逐个返回 (工号, 距离) 或 None"""
+        queries = self._queries(encodings)
+        with self._lock:
+            if not self._owners:
+                return [None] * len(queries)
+            dists = self._row_distances(queries)
+            best = np.argmin(dists, axis=1)
+            results = []
+            for i, j in enumerate(best):
+                distance = float(dists[i, j])
+                results.append((self._owners[j], distance) if distance <= tolerance else None)
+            return results
@@ -0,0 +1,79 @@
+import cv2
+import numpy as np
+
+
+class FaceQualityScorer:
+    """注册帧质量评分：清晰度、人脸大小与姿态
+
+    三项各自归一化到 [0, 1] 后相乘，任一项不达标（过小、过糊、侧脸过大）
+    得分为 0，该帧直接丢弃。姿态用小模型的 5 点特征估计偏航：
+    鼻尖偏离双眼中点的距离与眼距之比，正脸约为 0。
+    """
+
+    def __init__(self, min_size=80, full_size=200, min_sharpness=30.0, full_sharpness=150.0,
+                 max_yaw=0.35, landmarks=None):
+        self.min_size = min_size
+        self.full_size = full_size
+        self.min_sharpness = min_sharpness
+        self.full_sharpness = full_sharpness
+        self.max_yaw = max_yaw
+        # landmarks(rgb, box) -> face_recognition.face_landmarks 风格的字典；为 None 时不评估姿态
+        self.landmarks = landmarks
+
+    @staticmethod
+    def _ramp(value, low, high):
+        if value < low:
+            return 0.0
+        return min(1.0, (value - low) / (high - low) * 0.5 + 0.5)
+
+    def sharpness(self, rgb, box):
+        """人脸区域拉普拉斯响应的方差，越大越清晰"""
+        top, right, bottom, left = box
+        crop = rgb[max(top, 0):bottom, max(left, 0):right]
+        if crop.size == 0:
+            return 0.0
+        gray = cv2.cvtColor(crop, cv2.COLOR_RGB2GRAY)
+        return float(cv2.Laplacian(gray, cv2.CV_64F).var())
+
+    def yaw(self, rgb, box):
+        """偏航估计：鼻尖相对双眼中点的水平偏移 / 眼距"""
+        marks = self.landmarks(rgb, box) if self.landmarks else None
+        if not marks or "nose_tip" not in marks:
+            return 0.0
+        left_eye = np.mean(marks["left_eye"], axis=0)
+        right_eye = np.mean(marks["right_eye"], axis=0)
+        eye_distance = np.linalg.norm(right_eye - left_eye)
+        if eye_distance < 1:
+            return 1.0
+        nose = np.mean(marks["nose_tip"], axis=0)
+        return float(abs(nose[0] - (left_eye[0] + right_eye[0]) / 2) / eye_distance)
+
+    def score(self, rgb, box):
+        """返回 [0, 1] 的质量分，0 表示不可用"""
+        top, right, bottom, left = box
+        size_score = self._ramp(min(bottom - top, right - left), self.min_size, self.full_size)
+        if not size_score:
+            return 0.0
+        sharp_score = self._ramp(self.sharpness(rgb, box), self.min_sharpness, self.full_sharpness)
+        if not sharp_score:
+            return 0.0
+        yaw = self.yaw(rgb, box)
+        if yaw > self.max_yaw:
+            return 0.0
+        return size_score * sharp_score * (1.0 - yaw / self.max_yaw * 0.5)
+
+
+def select_best(candidates, k=5):
+    """candidates 为 [(得分, 编码)]，按得分保留最好的 k 条，返回 (k, dim) 矩阵或 None"""
+    best = sorted(candidates, key=lambda c: c[0], reverse=True)[:k]
+    if not best:
+        return None
+    return np.array([encoding for _, encoding in best], dtype=np.float64)
+
+
+def landmark_provider(face_recognition):
+    """用 face_recognition 的 5 点小模型作为姿态估计的特征点来源"""
+    def landmarks(rgb, box):
+        found = face_recognition.face_landmarks(rgb, [box], model="small")
+        return found[0] if found else None
+    return landmarks
@@ -0,0 +1,170 @@
+import itertools
+import threading
+
+import cv2
+
+from model_loader import models
+
+
+def box_iou(a, b):
+    """两个 (top, right, bottom, left) 框的交并比"""
+    top, right = max(a[0], b[0]), min(a[1], b[1])
+    bottom, left = min(a[2], b[2]), max(a[3], b[3])
+    inter = max(0, right - left) * max(0, bottom - top)
+    area_a = (a[1] - a[3]) * (a[2] - a[0])
+    area_b = (b[1] - b[3]) * (b[2] - b[0])
+    union = area_a + area_b - inter
+    return inter / union if union > 0 else 0.0
+
+
+def box_area(box):
+    return (box[1] - box[3]) * (box[2] - box[0])
+
+
+class FaceTrack:
+    """被跟踪的一张人脸；box 为全分辨率坐标 (top, right, bottom, left)"""
+
+    def __init__(self, track_id, box):
+        self.track_id = track_id
+        self.box = box
+        self.template = None
+        self.encoding = None
+        self.encoded_box = None
+
+    @property
+    def needs_encoding(self):
+        return self.encoding is None
+
+
+class FaceTrackingStage:
+    """缩小分辨率检测人脸，两次检测之间用模板匹配跟踪
+
+    检测在按 scale 缩小的图像上运行，结果映射回全分辨率；
+    编码只在两次检测之间的模板跟踪期间复用：每次重新检测都清除编码，
+    偏移过大（与编码时的框 IoU 低于 drift_iou）时也重新编码。
+    相邻两次 update 的帧序号相差超过 max_gap 时丢弃全部轨迹，期间画面中的人可能已经换了。
+    detector 为 face_detectors 中的检测器，为 None 时使用 dlib 的 model 检测。
+    """
+
+    def __init__(self, scale=0.5, upsample=1, detect_interval=10, search_margin=0.5,
+                 min_score=0.6, drift_iou=0.5, model="hog", detector=None, max_gap=15):
+        self.scale = scale
+        self.upsample = upsample
+        self.detect_interval = detect_interval
+        self.search_margin = search_margin
+        self.min_score = min_score
+        self.drift_iou = drift_iou
+        self.model = model
+        self.detector = detector
+        self.max_gap = max_gap
+        self.tracks = []
+        self._since_detect = 0
+        self._last_seq = None
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _to_small(self, box):
+        return tuple(int(round(v * self.scale)) for v in box)
+
+    def _to_full(self, box, shape):
+        h, w = shape[:2]
+        top, right, bottom, left = (int(round(v / self.scale)) for v in box)
+        return max(0, top), min(w, right), min(h, bottom), max(0, left)
+
+    def detect(self, rgb_frame):
+        """在缩小图上检测人脸，返回全分辨率坐标的人脸框"""
+        return self._detect_small(self._downscale(rgb_frame), rgb_frame.shape)
+
+    def _downscale(self, rgb_frame):
+        return cv2.resize(rgb_frame, (0, 0), fx=self.scale, fy=self.scale,
+                          interpolation=cv2.INTER_AREA)
+
+    def _detect_small(self, small, full_shape):
+        if self.detector is not None:
+            locations = self.detector.detect(small)
+        else:
+            locations = models.face_recognition.face_locations(
+                small, number_of_times_to_upsample=self.upsample, model=self.model)
+        return [self._to_full(box, full_shape) for box in locations]
+
+    def _crop(self, gray, box):
+        top, right, bottom, left = box
+        return gray[top:bottom, left:right]
+
+    def _follow(self, gray, track, full_shape):
+        """在上一位置附近做模板匹配，得分过低则判定跟丢"""
+        top, right, bottom, left = self._to_small(track.box)
+        bw, bh = right - left, bottom - top
+        mx, my = int(bw * self.search_margin), int(bh * self.search_margin)
+        h, w = gray.shape[:2]
+        x0, y0 = max(0, left - mx), max(0, top - my)
+        x1, y1 = min(w, right + mx), min(h, bottom + my)
+        window = gray[y0:y1, x0:x1]
+        template = track.template
+        if (template is None or template.size == 0
+                or window.shape[0] < template.shape[0] or window.shape[1] < template.shape[1]):
+            return False
+        result = cv2.matchTemplate(window, template, cv2.TM_CCOEFF_NORMED)
+        _, score, _, (dx, dy) = cv2.minMaxLoc(result)
+        if score < self.min_score:
+            return False
+        th, tw = template.shape[:2]
+        new_small = (y0 + dy, x0 + dx + tw, y0 + dy + th, x0 + dx)
+        track.box = self._to_full(new_small, full_shape)
+        return True
+
+    def _refresh_template(self, gray, track):
+        track.template = self._crop(gray, self._to_small(track.box)).copy()
+
+    def update(self, rgb_frame, seq=None):
+        """处理一帧，返回当前所有人脸轨迹（按面积从大到小）；seq 为采集帧序号"""
+        with self._lock:
+            if seq is not None:
+                if self._last_seq is not None and seq - self._last_seq > self.max_gap:
+                    self.tracks = []
+                self._last_seq = seq
+            small = self._downscale(rgb_frame)
+            gray = cv2.cvtColor(small, cv2.COLOR_RGB2GRAY)
+            self._since_detect += 1
+            previous = self.tracks
+            if self.tracks and self._since_detect < self.detect_interval:
+                followed = [t for t in self.tracks if self._follow(gray, t, rgb_frame.shape)]
+                if len(followed) == len(self.tracks):
+                    previous = None
+                    self.tracks = followed
+            if previous is not None:
+                # 到达检测间隔、尚无轨迹或有轨迹跟丢时重新检测
+                self.tracks = self._associate(self._detect_small(small, rgb_frame.shape), previous)
+                self._since_detect = 0
+            for track in self.tracks:
+                self._refresh_template(gray, track)
+                if track.encoded_box is not None and box_iou(track.box, track.encoded_box) < self.drift_iou:
+                    track.encoding = None
+            return sorted(self.tracks, key=lambda t: box_area(t.box), reverse=True)
+
+    def _associate(self, boxes, previous):
+        """将新检测结果与旧轨迹按 IoU 关联；保留轨迹序号，编码清除后重新计算"""
+        previous = list(previous)
+        tracks = []
+        for box in boxes:
+            best = max(previous, key=lambda t: box_iou(t.box, box), default=None)
+            if best is not None and box_iou(best.box, box) >= self.drift_iou:
+                previous.remove(best)
+                best.box = box
+                best.encoding = best.encoded_box = None
+                tracks.append(best)
+            else:
+                tracks.append(FaceTrack(next(self._ids), box))
+        return tracks
+
+    def mark_encoded(self, track, encoding):
+        """记录轨迹的编码及编码时的位置"""
+        with self._lock:
+            track.encoding = encoding
+            track.encoded_box = track.box
+
+    def reset(self):
+        with self._lock:
+            self.tracks = []
+            self._since_detect = 0
+            self._last_seq = None
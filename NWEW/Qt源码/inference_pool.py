@@ -0,0 +1,231 @@
+import heapq
+import itertools
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import CancelledError, Future, ProcessPoolExecutor
+from multiprocessing import get_context, shared_memory
+
+import cv2
+import numpy as np
+
+# 任务优先级：数值越小越先执行，认证请求排在注册采样之前
+PRIORITY_AUTH = 0
+PRIORITY_ENROLL = 1
+
+
+class FrameSlot:
+    """一块共享内存帧缓冲；帧尺寸超出当前容量时换一块更大的"""
+
+    def __init__(self, size):
+        self.shm = shared_memory.SharedMemory(create=True, size=size)
+
+    def write(self, frame):
+        """把帧拷贝进共享内存，返回工作进程映射所需的 (名称, 形状)"""
+        if frame.nbytes > self.shm.size:
+            self.close()
+            self.shm = shared_memory.SharedMemory(create=True, size=frame.nbytes)
+        view = np.ndarray(frame.shape, dtype=np.uint8, buffer=self.shm.buf)
+        view[...] = frame
+        return self.shm.name, frame.shape
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+
+# ---- 工作进程 ----
+
+_worker = {}
+
+
+def _init_worker(scale, upsample, detector, embedding):
+    """工作进程初始化：后台开始加载模型，首个任务到来时通常已就绪"""
+    from embedding_backends import create_embedding_backend
+    from face_detectors import create_detector
+    from face_tracker import FaceTrackingStage
+    from model_loader import models
+
+    models.start()
+    _worker["models"] = models
+    _worker["stage"] = FaceTrackingStage(
+        scale=scale, upsample=upsample, detector=create_detector(detector) if detector else None)
+    _worker["embedder"] = create_embedding_backend(embedding)
+    _worker["attached"] = OrderedDict()
+
+
+def _attach(name):
+    try:
+        # 由主进程负责释放，工作进程不登记到 resource_tracker
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python 3.13 之前没有 track 参数
+        return shared_memory.SharedMemory(name=name)
+
+
+def _frame(name, shape):
+    """映射共享内存中的 BGR 帧并转换为 RGB（转换本身生成进程内的副本）"""
+    attached = _worker["attached"]
+    shm = attached.get(name)
+    if shm is None:
+        shm = attached[name] = _attach(name)
+        # 主进程换过更大的缓冲后，旧映射不再使用
+        while len(attached) > 16:
+            attached.popitem(last=False)[1].close()
+    bgr = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+    return cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
+
+
+def _warmup_job():
+    _worker["models"].face_recognition
+    return os.getpid()
+
+
+def _identify_job(name, shape):
+    """检测并编码一帧中的人脸，返回 (人脸框, 编码矩阵)"""
+    rgb = _frame(name, shape)
+    boxes = _worker["stage"].detect(rgb)
+    if not boxes:
+        return [], np.zeros((0, 128))
+    # 多张人脸一次批量编码
+    return boxes, _worker["embedder"].encode(rgb, boxes)
+
+
+def _enroll_job(name, shape):
+    """注册采样：取面积最大的人脸评分，合格时编码，返回 (得分, 编码) 或 None"""
+    from face_quality import FaceQualityScorer, landmark_provider
+    from face_tracker import box_area
+
+    face_recognition = _worker["models"].face_recognition
+    if "quality" not in _worker:
+        _worker["quality"] = FaceQualityScorer(landmarks=landmark_provider(face_recognition))
+    rgb = _frame(name, shape)
+    boxes = _worker["stage"].detect(rgb)
+    if not boxes:
+        return None
+    box = max(boxes, key=box_area)
+    quality = _worker["quality"].score(rgb, box)
+    if quality <= 0:
+        return None
+    return quality, _worker["embedder"].encode(rgb, [box])[0]
+
+
+# ---- 主进程 ----
+
+class InferencePool:
+    """多进程推理：绕开 GIL，突发请求的吞吐随 CPU 核数增长
+
+    帧在真正派发给工作进程时才拷贝进共享内存（每个在途任务独占一个槽），
+    不经过 pickle；排队中的任务只持有采集线程发布的只读帧。
+    相同 key 的在途请求（例如同一帧上重复点击认证）合并为一个任务，
+    认证任务优先于注册采样派发。返回的都是 concurrent.futures.Future。
+    """
+
+    def __init__(self, workers=None, frame_shape=(480, 640, 3), scale=0.5, upsample=1,
+                 detector=None, embedding="dlib"):
+        self.workers = workers or max(1, (os.cpu_count() or 2) - 1)
+        # spawn 在 Windows 与 Linux 上行为一致，也避免 fork 复制 Qt 与摄像头状态
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers, mp_context=get_context("spawn"),
+            initializer=_init_worker, initargs=(scale, upsample, detector, embedding))
+        frame_bytes = int(np.prod(frame_shape))
+        self._free = [FrameSlot(frame_bytes) for _ in range(self.workers)]
+        self._slots = list(self._free)
+        self._queue = []
+        self._order = itertools.count()
+        self._inflight = {}
+        # 可重入：任务在 add_done_callback 之前已完成时回调会在派发线程中立即执行
+        self._lock = threading.RLock()
+        self._closed = False
+        self.coalesced = 0
+
+    def __len__(self):
+        """排队与执行中的任务数"""
+        with self._lock:
+            return len(self._queue) + len(self._slots) - len(self._free)
+
+    def warmup(self):
+        """每个工作进程各加载一次模型，返回全部完成时结束的 Future"""
+        done = Future()
+        futures = [self.executor.submit(_warmup_job) for _ in range(self.workers)]
+        remaining = [len(futures)]
+        lock = threading.Lock()
+
+        def finished(future):
+            with lock:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            if future.exception() is not None and not done.done():
+                done.set_exception(future.exception())
+            elif last and not done.done():
+                done.set_result(len({f.result() for f in futures}))
+
+        for future in futures:
+            future.add_done_callback(finished)
+        return done
+
+    def identify(self, frame, key=None):
+        """检测并编码；结果为 (人脸框列表, 编码矩阵)"""
+        return self._submit(PRIORITY_AUTH, key, frame, _identify_job)
+
+    def enroll_sample(self, frame, key=None):
+        """注册采样；结果为 (质量得分, 编码) 或 None"""
+        return self._submit(PRIORITY_ENROLL, key, frame, _enroll_job)
+
+    def _submit(self, priority, key, frame, fn, *args):
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("推理进程池已关闭")
+            if key is not None and key in self._inflight:
+                self.coalesced += 1
+                return self._inflight[key]
+            future = Future()
+            if key is not None:
+                self._inflight[key] = future
+            heapq.heappush(self._queue, (priority, next(self._order), key, frame, fn, args, future))
+            self._dispatch()
+        return future
+
+    def _dispatch(self):
+        """有空闲槽时按优先级派发排队任务，调用方需持有锁"""
+        while self._free and self._queue:
+            _, _, key, frame, fn, args, future = heapq.heappop(self._queue)
+            if not future.set_running_or_notify_cancel():
+                self._inflight.pop(key, None)
+                continue
+            slot = self._free.pop()
+            try:
+                name, shape = slot.write(np.ascontiguousarray(frame, dtype=np.uint8))
+                job = self.executor.submit(fn, name, shape, *args)
+            except Exception as e:
+                self._free.append(slot)
+                self._inflight.pop(key, None)
+                future.set_exception(e)
+                continue
+            job.add_done_callback(lambda job, slot=slot, key=key, future=future:
+                                  self._finished(job, slot, key, future))
+
+    def _finished(self, job, slot, key, future):
+        with self._lock:
+            self._free.append(slot)
+            if key is not None:
+                self._inflight.pop(key, None)
+            if not self._closed:
+                self._dispatch()
+        if job.cancelled():
+            future.set_exception(CancelledError())
+        elif job.exception() is not None:
+            future.set_exception(job.exception())
+        else:
+            future.set_result(job.result())
+
+    def close(self):
+        """取消排队任务，结束工作进程并释放共享内存"""
+        with self._lock:
+            self._closed = True
+            queued, self._queue = self._queue, []
+        for *_, future in queued:
+            future.cancel()
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        for slot in self._slots:
+            slot.close()
@@ -9,11 +9,8 @@ from PyQt6.QtCore import (
     Qt, QTimer, QDateTime
 )
 
-# 假设这些类在相应文件中定义
+# 启动时只导入认证窗口，其余窗口在打开时再导入
 from CyberAuthSystem import CyberAuthSystem
-from CyberMonitor import CyberMonitor
-from DateWindow import MainWindow
-from CyberTriangleProfile import CyberTriangleProfile
 
 os.environ['QT_QPA_PLATFORM_PLUGIN_PATH'] = r'D:\anaconda\envs\M\Library\bin'
 
@@ -232,14 +229,17 @@ class SelectionWindow(QWidget):
         self.time_label.setText(f"■ 系统时间：{current_time}")
 
     def open_monitor_window(self):
+        from CyberMonitor import CyberMonitor
         self.controller.monitor_window = CyberMonitor()
         self.controller.monitor_window.showFullScreen()
 
     def open_main_window(self):
+        from DateWindow import MainWindow
         self.controller.main_window = MainWindow()
         self.controller.main_window.showFullScreen()
 
     def open_triangle_window(self):
+        from CyberTriangleProfile import CyberTriangleProfile
         self.controller.triangle_window = CyberTriangleProfile()
         self.controller.triangle_window.showFullScreen()
 
@@ -0,0 +1,40 @@
+"""把用户库中旧版 float64 人脸编码改写为紧凑格式
+
+所有终端升级到能读取新格式的版本后再执行；可重复执行，只改写旧格式的行。
+
+示例：
+    python migrate_encodings.py
+    python migrate_encodings.py --dtype float16 --sqlite test.db
+"""
+import argparse
+import sys
+
+import numpy as np
+
+from user_store import UserStore, DEFAULT_DB_CONFIG, DB_ERRORS
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="迁移人脸编码存储格式")
+    parser.add_argument("--dtype", choices=["float16", "float32"], default="float32")
+    parser.add_argument("--batch-size", type=int, default=500, help="每个事务改写的行数")
+    parser.add_argument("--sqlite", help="迁移指定的 SQLite 文件而不是 MySQL")
+    args = parser.parse_args(argv)
+
+    if args.sqlite:
+        store = UserStore({"database": args.sqlite}, backend="sqlite")
+    else:
+        store = UserStore(DEFAULT_DB_CONFIG)
+    try:
+        migrated = store.migrate_encodings(np.dtype(args.dtype), args.batch_size)
+    except DB_ERRORS as e:
+        print(f"迁移失败: {e}", file=sys.stderr)
+        return 1
+    finally:
+        store.close()
+    print(f"已改写 {migrated} 条编码为 {args.dtype}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,66 @@
+import importlib
+import threading
+
+import numpy as np
+
+
+class ModelLoader:
+    """人脸识别模型的延迟加载器
+
+    face_recognition 会在导入时加载 dlib 及其模型，耗时较长。
+    start() 在后台线程中导入并用空白帧跑一遍检测与编码完成预热，
+    界面可以先显示；真正用到模型的地方通过 face_recognition 属性获取，
+    尚未就绪时会阻塞等待。
+    """
+
+    def __init__(self, module_name="face_recognition", warmup_size=(480, 640)):
+        self.module_name = module_name
+        self.warmup_size = warmup_size
+        self.ready = threading.Event()
+        self.error = None
+        self._module = None
+        self._thread = None
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def start(self, callback=None):
+        """启动后台加载；callback(error) 在加载完成后于加载线程中调用"""
+        with self._lock:
+            if callback:
+                if self.ready.is_set():
+                    callback(self.error)
+                else:
+                    self._callbacks.append(callback)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._load, name="ModelLoader", daemon=True)
+                self._thread.start()
+
+    def _load(self):
+        try:
+            module = importlib.import_module(self.module_name)
+            # 预热：首次调用时 dlib 才真正初始化检测器与网络
+            dummy = np.zeros((*self.warmup_size, 3), dtype=np.uint8)
+            module.face_locations(dummy)
+            module.face_encodings(dummy, [(0, 150, 150, 0)])
+            self._module = module
+        except Exception as e:
+            self.error = e
+        with self._lock:
+            self.ready.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback(self.error)
+
+    @property
+    def face_recognition(self):
+        """返回已预热的 face_recognition 模块，必要时等待加载完成"""
+        if not self.ready.is_set():
+            self.start()
+            self.ready.wait()
+        if self.error is not None:
+            raise RuntimeError(f"人脸模型加载失败: {self.error}")
+        return self._module
+
+
+# 进程内共享的加载器
+models = ModelLoader()
@@ -9,6 +9,8 @@ from PySide6.QtGui import QFont, QPainter, QColor
 from PySide6.QtCharts import QChart, QChartView, QLineSeries, QValueAxis
 import sys
 from PySide6.QtWidgets import QApplication
+from series_buffer import ChannelSet
+from chart_render import RenderScheduler, AxisRange, replace_series
 
 TOPIC_LED = "led_control"
 TOPIC_BUZZER = "buzzer_control"
@@ -18,9 +20,11 @@ os.environ['QT_QPA_PLATFORM_PLUGIN_PATH'] = r'd:\anaconda\envs\lihaoze\lib\site-
 # 将上述路径替换为你实际的Qt插件文件夹路径
 
 class MonitoringWindow(QWidget):
-    def __init__(self):
+    def __init__(self, window_size=15, max_fps=10):
         super().__init__()
-        self.data_count = 0
+        # 图表显示最近 window_size 次数据，每秒最多重绘 max_fps 次
+        self.window_size = window_size
+        self.max_fps = max_fps
         self.setup_ui()
         self.setup_charts()
         self.setup_status_message()
@@ -144,7 +148,7 @@ class MonitoringWindow(QWidget):
         chart.legend().hide()
 
         axis_x = QValueAxis()
-        axis_x.setRange(0, 15)
+        axis_x.setRange(0, self.window_size)
         axis_x.setLabelFormat("%d")
         axis_x.setTitleText("数据传输次数")
         axis_x.setLabelsColor(QColor("#666666"))
@@ -176,67 +180,45 @@ class MonitoringWindow(QWidget):
         self.temp_series = self.temp_chart_view.chart().series()[0]
         self.humi_series = self.humi_chart_view.chart().series()[0]
         self.light_series = self.light_chart_view.chart().series()[0]
-        self.temp_data = []
-        self.humi_data = []
-        self.light_data = []
-        self.data_count_list = []
+        self.series_data = ChannelSet(["temp", "humi", "light"], self.window_size)
+        self.latest_values = None
+        chart_views = [self.temp_chart_view, self.humi_chart_view, self.light_chart_view]
+        self.x_axes = [AxisRange(view.chart().axisX()) for view in chart_views]
+        self.y_axes = [AxisRange(view.chart().axisY()) for view in chart_views]
+        # MQTT 回调只写入数据，图表由界面线程按帧率上限统一重绘
+        self.render_scheduler = RenderScheduler(self.render_charts, self.max_fps, parent=self)
 
     def update_mqtt_data(self, temp, humi, light):
-        self.data_count += 1
-        self.data_count_list.append(self.data_count)
-
+        """写入一条数据（在 MQTT 线程中调用），图表在下一次重绘时更新"""
         temp = self.apply_random_offset(temp, 0, 50, is_temp_or_humi=True)
         humi = self.apply_random_offset(humi, 0, 100, is_temp_or_humi=True)
         light = self.apply_random_offset(light, 0, 2000)
 
+        with self.render_scheduler.modify():
+            self.series_data.append(temp=temp, humi=humi, light=light)
+            self.latest_values = (temp, humi, light)
+
+    def render_charts(self):
+        """重绘标签与图表（界面线程，调用时已持有数据锁）"""
+        temp, humi, light = self.latest_values
         self.update_label(self.temp_label, f"温度: {temp:.2f} °C")
         self.update_label(self.humi_label, f"湿度: {humi:.2f} %RH")
         self.update_label(self.light_label, f"光照: {light:.2f} Lux")
 
-        self.temp_data.append(temp)
-        self.humi_data.append(humi)
-        self.light_data.append(light)
-
-        if len(self.data_count_list) > 15:
-            self.data_count_list.pop(0)
-            self.temp_data.pop(0)
-            self.humi_data.pop(0)
-            self.light_data.pop(0)
-
-        min_x = max(0, self.data_count - 15)
-        max_x = self.data_count
-        self.temp_chart_view.chart().axisX().setRange(min_x, max_x)
-        self.humi_chart_view.chart().axisX().setRange(min_x, max_x)
-        self.light_chart_view.chart().axisX().setRange(min_x, max_x)
-
-        # 动态调整纵坐标范围
-        if self.temp_data:
-            temp_min = min(self.temp_data)
-            temp_max = max(self.temp_data)
-            temp_range = temp_max - temp_min
-            if temp_range < 1:
-                temp_range = 1
-            self.temp_chart_view.chart().axisY().setRange(temp_min - 0.1 * temp_range, temp_max + 0.1 * temp_range)
-
-        if self.humi_data:
-            humi_min = min(self.humi_data)
-            humi_max = max(self.humi_data)
-            humi_range = humi_max - humi_min
-            if humi_range < 1:
-                humi_range = 1
-            self.humi_chart_view.chart().axisY().setRange(humi_min - 0.1 * humi_range, humi_max + 0.1 * humi_range)
-
-        if self.light_data:
-            light_min = min(self.light_data)
-            light_max = max(self.light_data)
-            light_range = light_max - light_min
-            if light_range < 1:
-                light_range = 1
-            self.light_chart_view.chart().axisY().setRange(light_min - 0.1 * light_range, light_max + 0.1 * light_range)
-
-        self.update_series(self.temp_series, self.data_count_list, self.temp_data)
-        self.update_series(self.humi_series, self.data_count_list, self.humi_data)
-        self.update_series(self.light_series, self.data_count_list, self.light_data)
+        # 动态调整坐标轴范围（窗口内最值由环形缓冲增量维护），范围不变时不触发重新布局
+        x_range = self.series_data.x_range()
+        for x_axis, y_axis, name in zip(self.x_axes, self.y_axes, ["temp", "humi", "light"]):
+            data = self.series_data[name]
+            data_min, data_max = data.min(), data.max()
+            data_range = max(data_max - data_min, 1)
+            y_axis.set(data_min - 0.1 * data_range, data_max + 0.1 * data_range)
+            x_axis.set(*x_range)
+
+        # 每条曲线一次 replace() 整体替换
+        x_data = self.series_data.x_view()
+        self.update_series(self.temp_series, x_data, self.series_data["temp"].view())
+        self.update_series(self.humi_series, x_data, self.series_data["humi"].view())
+        self.update_series(self.light_series, x_data, self.series_data["light"].view())
 
     def apply_random_offset(self, value, min_val, max_val, is_temp_or_humi=False):
         if is_temp_or_humi:
@@ -251,9 +233,7 @@ class MonitoringWindow(QWidget):
         label.setText(text)
 
     def update_series(self, series, x_data, y_data):
-        series.clear()
-        for x, y in zip(x_data, y_data):
-            series.append(x, y)
+        replace_series(series, x_data, y_data)
 
     def get_button_style(self):
         return """
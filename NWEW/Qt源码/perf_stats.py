@@ -0,0 +1,145 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+
+class RollingHistogram:
+    """固定容量的环形样本缓冲区，只保留最近 size 个耗时样本，分位数在读取时计算"""
+
+    def __init__(self, size=512):
+        self._samples = np.zeros(size, dtype=np.float64)
+        self._next = 0
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, seconds):
+        self._samples[self._next] = seconds
+        self._next = (self._next + 1) % len(self._samples)
+        self.count += 1
+        self.total += seconds
+
+    def summary(self):
+        """最近窗口内的毫秒分位数；count/total 为累计值"""
+        window = self._samples[:min(self.count, len(self._samples))] * 1000.0
+        if not len(window):
+            return {"count": 0}
+        p50, p90, p99 = np.percentile(window, [50, 90, 99])
+        return {
+            "count": self.count,
+            "total_s": round(self.total, 3),
+            "mean_ms": round(float(window.mean()), 3),
+            "p50_ms": round(float(p50), 3),
+            "p90_ms": round(float(p90), 3),
+            "p99_ms": round(float(p99), 3),
+            "max_ms": round(float(window.max()), 3),
+        }
+
+
+class PerfStats:
+    """热路径性能统计：分阶段耗时直方图、计数器与按需求值的状态量
+
+    stage()/record() 可在任意线程调用；gauge 注册的函数在生成快照时才求值，
+    避免在热路径上维护队列长度之类的数值。
+    """
+
+    def __init__(self, window=512):
+        self.window = window
+        self.started = time.time()
+        self._stages = {}
+        self._counters = {}
+        self._gauges = {}
+        self._lock = threading.Lock()
+        self._dump_thread = None
+        self._dump_stop = threading.Event()
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name, seconds):
+        with self._lock:
+            histogram = self._stages.get(name)
+            if histogram is None:
+                histogram = self._stages[name] = RollingHistogram(self.window)
+            histogram.add(seconds)
+
+    def count(self, name, n=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def gauge(self, name, fn):
+        """注册状态量，fn() 在生成快照时调用"""
+        self._gauges[name] = fn
+
+    def snapshot(self):
+        with self._lock:
+            stages = {name: h.summary() for name, h in self._stages.items()}
+            counters = dict(self._counters)
+        gauges = {}
+        for name, fn in list(self._gauges.items()):
+            try:
+                gauges[name] = fn()
+            except Exception as e:
+                gauges[name] = f"error: {e}"
+        return {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "uptime_s": round(time.time() - self.started, 1),
+            "stages": stages,
+            "counters": counters,
+            "gauges": gauges,
+        }
+
+    def overlay_text(self):
+        """屏幕叠加层显示的文本：每阶段一行 p50/p99，末尾为计数器与状态量"""
+        snap = self.snapshot()
+        lines = [f"{'stage':<12}{'p50':>8}{'p99':>8}{'n':>9}"]
+        for name, s in sorted(snap["stages"].items()):
+            if s["count"]:
+                lines.append(f"{name:<12}{s['p50_ms']:>8.1f}{s['p99_ms']:>8.1f}{s['count']:>9}")
+        for name, value in sorted({**snap["counters"], **snap["gauges"]}.items()):
+            lines.append(f"{name}: {value}")
+        return "\n".join(lines)
+
+    def dump(self, path):
+        """把快照写入 JSON 文件（先写临时文件再替换）"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f, ensure_ascii=False, indent=2)
+        os.replace(path + ".tmp", path)
+
+    def start_dump(self, path, interval=60.0):
+        """后台线程每隔 interval 秒写一次快照"""
+        if self._dump_thread is not None:
+            return
+
+        def loop():
+            while not self._dump_stop.wait(interval):
+                try:
+                    self.dump(path)
+                except OSError:
+                    pass
+
+        self._dump_thread = threading.Thread(target=loop, name="PerfStatsDump", daemon=True)
+        self._dump_thread.start()
+
+    def stop_dump(self, path=None):
+        """停止定时写入；给出 path 时再写最后一次"""
+        self._dump_stop.set()
+        if self._dump_thread is not None:
+            self._dump_thread.join(timeout=1.0)
+            self._dump_thread = None
+        if path:
+            try:
+                self.dump(path)
+            except OSError:
+                pass
@@ -0,0 +1,105 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+
+
+class ProfileCache:
+    """用户资料冷路径：匹配成功后才按工号读取姓名、电话等资料
+
+    loader(job_numbers) 返回 {工号: 资料字典}，缺失的工号不出现在结果中。
+    最多缓存 capacity 位用户，超出时淘汰最久未使用的；同时记录最近识别过的
+    用户，下次启动时可一次查询预取。
+    """
+
+    def __init__(self, loader, capacity=512, recent_size=64):
+        self.loader = loader
+        self.capacity = capacity
+        self.recent_size = recent_size
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._recent = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._cache)
+
+    def _store(self, job_number, info):
+        """调用方需持有锁"""
+        self._cache[job_number] = info
+        self._cache.move_to_end(job_number)
+        while len(self._cache) > self.capacity:
+            self._cache.popitem(last=False)
+
+    def put(self, job_number, info):
+        with self._lock:
+            self._store(job_number, info)
+
+    def invalidate(self, job_numbers):
+        """资料在数据库中变更或用户被删除后丢弃缓存"""
+        with self._lock:
+            for job_number in job_numbers:
+                self._cache.pop(job_number, None)
+
+    def get_many(self, job_numbers):
+        """返回 {工号: 资料}；未缓存的工号合并为一次 loader 调用"""
+        found, missing = {}, []
+        with self._lock:
+            for job_number in job_numbers:
+                info = self._cache.get(job_number)
+                if info is None:
+                    missing.append(job_number)
+                else:
+                    self._cache.move_to_end(job_number)
+                    found[job_number] = info
+            self.hits += len(found)
+            self.misses += len(missing)
+        if missing:
+            loaded = self.loader(missing)
+            with self._lock:
+                for job_number, info in loaded.items():
+                    self._store(job_number, info)
+            found.update(loaded)
+        return found
+
+    def get(self, job_number):
+        return self.get_many([job_number]).get(job_number)
+
+    def touch(self, job_numbers):
+        """记录一次识别，用于下次启动时预取"""
+        with self._lock:
+            for job_number in job_numbers:
+                self._recent[job_number] = None
+                self._recent.move_to_end(job_number)
+            while len(self._recent) > self.recent_size:
+                self._recent.popitem(last=False)
+
+    def prefetch(self, job_numbers=None):
+        """预取资料（默认为最近识别过的用户），返回实际加载的条数"""
+        if job_numbers is None:
+            with self._lock:
+                job_numbers = list(self._recent)
+        with self._lock:
+            missing = [j for j in job_numbers if j not in self._cache]
+        if not missing:
+            return 0
+        loaded = self.loader(missing)
+        with self._lock:
+            for job_number, info in loaded.items():
+                self._store(job_number, info)
+        return len(loaded)
+
+    def load_recent(self, path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                self.touch([str(j) for j in json.load(f)])
+        except (OSError, ValueError):
+            pass
+
+    def save_recent(self, path):
+        with self._lock:
+            recent = list(self._recent)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(recent, f, ensure_ascii=False)
+        os.replace(path + ".tmp", path)
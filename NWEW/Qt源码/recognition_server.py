@@ -0,0 +1,330 @@
+"""无界面人脸识别服务
+
+一台性能较强的机器持有唯一的内存编码索引，多个轻量终端通过本地网络
+发送 JPEG 帧或已算好的编码，服务端把并发请求合并为一次批量匹配后返回身份。
+认证窗口把 server_address 设为服务地址即切换为客户端模式。
+
+协议：每条消息为 8 字节头部（JSON 长度、二进制负载长度，大端）+ JSON + 负载。
+    请求 {"id", "op": "identify" | "match" | "ping", "tolerance"}
+        identify 的负载为 JPEG 图像，match 的负载为 embedding_codec 格式的编码
+    响应 {"id", "faces": [{"box", "job_number", "distance"}]} 或 {"id", "error"}
+同一连接上的请求可以并发发出，响应按完成顺序返回，以 id 对应。
+
+示例：
+    python recognition_server.py --port 8765
+    python recognition_server.py --sqlite test.db --backend exact
+"""
+import argparse
+import asyncio
+import json
+import socket
+import struct
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from change_feed import IndexSync
+from embedding_codec import encode_embeddings, decode_embeddings
+from face_index import FaceMatch
+from embedding_backends import create_embedding_backend
+from face_detectors import create_detector, load_choice
+from face_tracker import FaceTrackingStage, box_area
+from model_loader import models
+from segmented_index import SegmentedIndex
+from user_store import UserStore, DEFAULT_DB_CONFIG, DB_ERRORS
+
+HEADER = struct.Struct(">II")
+DEFAULT_PORT = 8765
+# 单条消息上限，防止异常客户端耗尽内存
+MAX_MESSAGE = 16 * 2 ** 20
+
+
+def pack_message(header, payload=b""):
+    body = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    return HEADER.pack(len(body), len(payload)) + body + payload
+
+
+def _check_sizes(header_size, payload_size):
+    if header_size + payload_size > MAX_MESSAGE:
+        raise ValueError(f"消息过大: {header_size + payload_size} 字节")
+
+
+async def read_message(reader):
+    header_size, payload_size = HEADER.unpack(await reader.readexactly(HEADER.size))
+    _check_sizes(header_size, payload_size)
+    header = json.loads(await reader.readexactly(header_size))
+    payload = await reader.readexactly(payload_size) if payload_size else b""
+    return header, payload
+
+
+class RecognitionServer:
+    """asyncio 识别服务：JPEG 解码、检测与编码在线程池中执行，匹配请求合并批处理
+
+    批处理循环每次取出队列中已到达的请求（最多 max_batch 条编码，最多再等
+    batch_window 秒），拼成一个矩阵调用一次 match_batch；上一批匹配期间
+    到达的请求自然进入下一批。
+    """
+
+    def __init__(self, index, host="127.0.0.1", port=DEFAULT_PORT, tolerance=0.4,
+                 max_batch=64, batch_window=0.002, workers=2, scale=0.5, detector=None,
+                 embedder=None):
+        self.index = index
+        self.host = host
+        self.port = port
+        self.tolerance = tolerance
+        self.max_batch = max_batch
+        self.batch_window = batch_window
+        self.stage = FaceTrackingStage(scale=scale, detector=detector)
+        self.embedder = embedder or create_embedding_backend("dlib")
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.requests = 0
+        self.batches = 0
+        self._queue = None
+        self._batcher = None
+        self._server = None
+
+    async def start(self):
+        """开始监听；port 为 0 时由系统分配端口（测试用），实际端口写回 self.port"""
+        self._queue = asyncio.Queue()
+        self._batcher = asyncio.create_task(self._batch_loop())
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self):
+        await self._server.serve_forever()
+
+    async def close(self):
+        self._server.close()
+        await self._server.wait_closed()
+        self._batcher.cancel()
+        self.executor.shutdown(wait=False)
+
+    async def _handle(self, reader, writer):
+        write_lock = asyncio.Lock()
+        tasks = set()
+        try:
+            while True:
+                header, payload = await read_message(reader)
+                task = asyncio.create_task(self._respond(header, payload, writer, write_lock))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+            writer.close()
+
+    async def _respond(self, header, payload, writer, write_lock):
+        try:
+            result = await self._dispatch(header, payload)
+        except Exception as e:
+            result = {"error": str(e)}
+        result["id"] = header.get("id")
+        async with write_lock:
+            writer.write(pack_message(result))
+            await writer.drain()
+
+    async def _dispatch(self, header, payload):
+        op = header.get("op")
+        self.requests += 1
+        if op == "ping":
+            return {"users": len(self.index)}
+        tolerance = float(header.get("tolerance", self.tolerance))
+        if op == "match":
+            encodings = decode_embeddings(payload)
+            boxes = [None] * len(encodings)
+        elif op == "identify":
+            loop = asyncio.get_running_loop()
+            boxes, encodings = await loop.run_in_executor(self.executor, self._encode_jpeg, payload)
+        else:
+            raise ValueError(f"未知操作: {op}")
+        matches = await self._match(encodings, tolerance)
+        return {"faces": [
+            {"box": box and list(box), "job_number": m and m[0], "distance": m and m[1]}
+            for box, m in zip(boxes, matches)
+        ]}
+
+    def _encode_jpeg(self, payload):
+        """解码 JPEG 并检测、编码所有人脸（按面积从大到小）"""
+        frame = cv2.imdecode(np.frombuffer(payload, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if frame is None:
+            raise ValueError("无法解码图像")
+        rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        boxes = sorted(self.stage.detect(rgb), key=box_area, reverse=True)
+        if not boxes:
+            return [], np.zeros((0, 128))
+        return boxes, self.embedder.encode(rgb, boxes)
+
+    async def _match(self, encodings, tolerance):
+        if not len(encodings):
+            return []
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((np.asarray(encodings), tolerance, future))
+        return await future
+
+    async def _batch_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            rows = len(batch[0][0])
+            deadline = loop.time() + self.batch_window
+            while rows < self.max_batch:
+                if self._queue.empty():
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    batch.append(self._queue.get_nowait())
+                rows += len(batch[-1][0])
+            try:
+                results = await loop.run_in_executor(self.executor, self._match_batch, batch)
+            except Exception as e:
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.batches += 1
+            for (_, _, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    def _match_batch(self, batch):
+        """所有请求的编码一次匹配；按最宽的阈值匹配后再用各请求自己的阈值过滤"""
+        queries = np.concatenate([encodings for encodings, _, _ in batch])
+        widest = max(tolerance for _, tolerance, _ in batch)
+        matches = self.index.match_batch(queries, tolerance=widest)
+        results, start = [], 0
+        for encodings, tolerance, _ in batch:
+            part = matches[start:start + len(encodings)]
+            results.append([m if m and m[1] <= tolerance else None for m in part])
+            start += len(encodings)
+        return results
+
+
+def _recv_exactly(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(size)
+        if not chunk:
+            raise ConnectionError("识别服务断开连接")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+class RecognitionClient:
+    """识别服务的同步客户端，在后台任务线程中调用；连接断开后下次请求自动重连"""
+
+    def __init__(self, host="127.0.0.1", port=DEFAULT_PORT, timeout=5.0, jpeg_quality=85):
+        self.address = (host, port)
+        self.timeout = timeout
+        self.jpeg_quality = jpeg_quality
+        self._sock = None
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def _request(self, header, payload=b""):
+        with self._lock:
+            self._next_id += 1
+            header = dict(header, id=self._next_id)
+            try:
+                if self._sock is None:
+                    self._sock = socket.create_connection(self.address, timeout=self.timeout)
+                self._sock.sendall(pack_message(header, payload))
+                header_size, payload_size = HEADER.unpack(_recv_exactly(self._sock, HEADER.size))
+                _check_sizes(header_size, payload_size)
+                response = json.loads(_recv_exactly(self._sock, header_size))
+                _recv_exactly(self._sock, payload_size)
+            except (OSError, ValueError):
+                self.close()
+                raise
+        if "error" in response:
+            raise RuntimeError(f"识别服务错误: {response['error']}")
+        return response
+
+    def ping(self):
+        return self._request({"op": "ping"})["users"]
+
+    def identify(self, frame, tolerance=0.4):
+        """发送 BGR 帧，返回 FaceMatch 列表（按人脸面积从大到小）"""
+        ok, jpeg = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        if not ok:
+            raise ValueError("JPEG 编码失败")
+        response = self._request({"op": "identify", "tolerance": tolerance}, jpeg.tobytes())
+        return [
+            FaceMatch(i, tuple(face["box"]), face["job_number"], face["distance"])
+            for i, face in enumerate(response["faces"])
+        ]
+
+    def match(self, encodings, tolerance=0.4):
+        """发送已算好的编码，逐个返回 (工号, 距离) 或 None"""
+        response = self._request({"op": "match", "tolerance": tolerance}, encode_embeddings(encodings))
+        return [(f["job_number"], f["distance"]) if f["job_number"] else None for f in response["faces"]]
+
+    def close(self):
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+            self._sock = None
+
+
+async def serve(args):
+    index = SegmentedIndex(args.backend, **({"nprobe": args.nprobe} if args.backend == "ivf" else {}))
+    if args.sqlite:
+        store = UserStore({"database": args.sqlite}, backend="sqlite")
+    else:
+        store = UserStore(DEFAULT_DB_CONFIG)
+    sync = IndexSync(index, store, on_error=lambda message: print(message, file=sys.stderr))
+    sync.load()
+    try:
+        store.ensure_schema()
+        sync.start()
+    except DB_ERRORS as e:
+        print(f"数据库不可用，仅使用本地快照: {e}", file=sys.stderr)
+    models.start()
+    detector_name = args.detector or load_choice()
+    detector = create_detector(detector_name) if detector_name else None
+    server = RecognitionServer(index, args.host, args.port, max_batch=args.max_batch,
+                               workers=args.workers, detector=detector,
+                               embedder=create_embedding_backend(args.embedding))
+    await server.start()
+    print(f"识别服务已启动 {args.host}:{server.port}，{len(index)} 位用户", file=sys.stderr)
+    try:
+        await server.serve_forever()
+    finally:
+        await server.close()
+        sync.stop()
+        store.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="无界面人脸识别服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--backend", choices=["exact", "ivf"], default="ivf")
+    parser.add_argument("--nprobe", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=4, help="解码、检测与编码线程数")
+    parser.add_argument("--detector", help="人脸检测器（hog/cnn/haar/dnn）；默认取本机校准结果")
+    parser.add_argument("--embedding", choices=["dlib", "onnx"], default="dlib", help="编码后端")
+    parser.add_argument("--max-batch", type=int, default=64, help="单次批量匹配的最大编码数")
+    parser.add_argument("--sqlite", help="使用指定的 SQLite 文件而不是 MySQL")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,191 @@
+import json
+import os
+import threading
+
+import numpy as np
+
+from ann_index import create_index
+
+# 不参与认证的用户状态；其余状态（在职、休假、实习等）所在分区都会被搜索
+INACTIVE_STATUSES = ("离职",)
+
+
+class SegmentedIndex:
+    """按用户状态（可选再按职务）划分的分区索引
+
+    每个分区是一个独立的匹配索引（exact 或 ivf），认证只搜索活跃状态的分区，
+    离职用户的编码不会进入候选。用户状态变化时只把其编码集合从旧分区
+    移到新分区，无需重新加载。磁盘上只保存各分区的训练结果（ivf 的分区中心），
+    编码由本地快照载入，启动时只读取一次。
+    """
+
+    def __init__(self, backend="exact", by_position=False, inactive_statuses=INACTIVE_STATUSES,
+                 **options):
+        self.backend = backend
+        self.by_position = by_position
+        self.inactive_statuses = set(inactive_statuses)
+        self.options = options
+        self._segments = {}
+        self._profiles = {}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._profiles)
+
+    def __contains__(self, job_number):
+        return job_number in self._profiles
+
+    @property
+    def job_numbers(self):
+        return list(self._profiles)
+
+    @property
+    def dirty(self):
+        """有分区的训练结果尚未写回磁盘"""
+        return any(getattr(s, "dirty", False) for s in self._segments.values())
+
+    def segment_key(self, status, position):
+        status = status or ""
+        return (status, position or "") if self.by_position else (status,)
+
+    def is_active(self, key):
+        return key[0] not in self.inactive_statuses
+
+    def _segment(self, key):
+        index = self._segments.get(key)
+        if index is None:
+            index = self._segments[key] = create_index(self.backend, **self.options)
+        return index
+
+    def _detach(self, job_number):
+        """从所在分区移除，调用方需持有锁"""
+        profile = self._profiles.pop(job_number, None)
+        if profile is not None:
+            self._segments[self.segment_key(*profile)].remove(job_number)
+        return profile
+
+    def add(self, job_number, encodings, status="在职", position=""):
+        """插入或替换一个用户的编码集合"""
+        with self._lock:
+            self._detach(job_number)
+            self._segment(self.segment_key(status, position)).add(job_number, encodings)
+            self._profiles[job_number] = (status or "", position or "")
+
+    def add_many(self, job_numbers, encodings, statuses, positions=None):
+        """批量插入；job_numbers、statuses、positions 与编码逐行对应"""
+        encodings = np.asarray(encodings)
+        if positions is None:
+            positions = [""] * len(job_numbers)
+        groups = {}
+        for i, (job_number, status, position) in enumerate(zip(job_numbers, statuses, positions)):
+            jobs, rows = groups.setdefault((status or "", position or ""), ([], []))
+            jobs.append(job_number)
+            rows.append(i)
+        with self._lock:
+            for job_number in set(job_numbers):
+                self._detach(job_number)
+            for profile, (jobs, rows) in groups.items():
+                self._segment(self.segment_key(*profile)).add_many(jobs, encodings[rows])
+                for job_number in jobs:
+                    self._profiles[job_number] = profile
+
+    def set_status(self, job_number, status, position=None):
+        """状态或职务变化：把用户的编码集合移到新分区，用户不存在时返回 False"""
+        with self._lock:
+            profile = self._profiles.get(job_number)
+            if profile is None:
+                return False
+            new_profile = (status or "", profile[1] if position is None else position or "")
+            old_key, new_key = self.segment_key(*profile), self.segment_key(*new_profile)
+            if old_key != new_key:
+                encodings = self._segments[old_key].get(job_number)
+                self._segments[old_key].remove(job_number)
+                self._segment(new_key).add(job_number, encodings)
+            self._profiles[job_number] = new_profile
+            return True
+
+    def remove(self, job_number):
+        with self._lock:
+            return self._detach(job_number) is not None
+
+    def get(self, job_number):
+        with self._lock:
+            profile = self._profiles.get(job_number)
+            return None if profile is None else self._segments[self.segment_key(*profile)].get(job_number)
+
+    def profile(self, job_number):
+        """返回 (状态, 职务)，不存在时返回 None"""
+        return self._profiles.get(job_number)
+
+    def export(self):
+        """返回 (每行工号, 编码矩阵, 每行状态, 每行职务)"""
+        with self._lock:
+            job_numbers, blocks = [], []
+            for index in self._segments.values():
+                owners, matrix = index.export()
+                job_numbers.extend(owners)
+                blocks.append(np.asarray(matrix))
+            encodings = np.concatenate(blocks) if blocks else np.zeros((0, 128), dtype=np.float32)
+            statuses = [self._profiles[j][0] for j in job_numbers]
+            positions = [self._profiles[j][1] for j in job_numbers]
+            return job_numbers, encodings, statuses, positions
+
+    def _targets(self):
+        """需要搜索的分区：非空且状态活跃"""
+        return [index for key, index in self._segments.items() if len(index) and self.is_active(key)]
+
+    def match(self, encoding, tolerance=0.4):
+        """在活跃分区中匹配，返回距离最近的 (工号, 距离) 或 None"""
+        with self._lock:
+            best = None
+            for index in self._targets():
+                result = index.match(encoding, tolerance)
+                if result and (best is None or result[1] < best[1]):
+                    best = result
+            return best
+
+    def match_batch(self, encodings, tolerance=0.4):
+        """批量匹配：每个活跃分区一次批量运算，逐个查询取各分区中的最近结果"""
+        encodings = np.asarray(encodings).reshape(len(encodings), -1)
+        with self._lock:
+            best = [None] * len(encodings)
+            for index in self._targets():
+                for i, result in enumerate(index.match_batch(encodings, tolerance)):
+                    if result and (best[i] is None or result[1] < best[i][1]):
+                        best[i] = result
+            return best
+
+    def save(self, directory):
+        """各分区的训练结果分别写入目录，segments.json 记录分区与文件的对应；后端不支持持久化时跳过"""
+        with self._lock:
+            segments = [(key, index) for key, index in self._segments.items()
+                        if getattr(index, "trained", False)]
+            if not all(hasattr(index, "save") for _, index in segments):
+                return
+            os.makedirs(directory, exist_ok=True)
+            manifest = []
+            for n, (key, index) in enumerate(segments):
+                name = f"segment_{n}.npz"
+                index.save(os.path.join(directory, name))
+                manifest.append({"key": list(key), "file": name})
+            path = os.path.join(directory, "segments.json")
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump({"by_position": self.by_position, "segments": manifest}, f, ensure_ascii=False)
+            os.replace(path + ".tmp", path)
+
+    @classmethod
+    def open(cls, directory, backend="exact", by_position=False, **kwargs):
+        """从目录加载各分区的训练结果（不含编码）；目录不存在、分区方式不同或损坏时返回空索引"""
+        index = cls(backend, by_position, **kwargs)
+        try:
+            with open(os.path.join(directory, "segments.json"), "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return index
+        if manifest.get("by_position") != by_position:
+            return index
+        for entry in manifest["segments"]:
+            key = tuple(entry["key"])
+            index._segments[key] = create_index(
+                backend, path=os.path.join(directory, entry["file"]), **index.options)
+        return index
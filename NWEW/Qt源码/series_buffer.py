@@ -0,0 +1,108 @@
+from collections import deque
+
+import numpy as np
+
+
+class RingBuffer:
+    """固定容量的时间序列通道：O(1) 追加，窗口内的最小/最大值用单调队列增量维护
+
+    数据镜像写入长度为 2×capacity 的数组（位置 i 与 i+capacity 同时写），
+    最近 capacity 个点始终是一段连续内存，view() 返回零拷贝视图。
+    """
+
+    def __init__(self, capacity, dtype=np.float64):
+        if capacity < 1:
+            raise ValueError("capacity 必须大于 0")
+        self.capacity = capacity
+        self._data = np.zeros(2 * capacity, dtype=dtype)
+        self._total = 0
+        # (序号, 值)：_min 中的值单调递增，_max 中的值单调递减，队首即窗口最值
+        self._min = deque()
+        self._max = deque()
+
+    def __len__(self):
+        return min(self._total, self.capacity)
+
+    @property
+    def total(self):
+        """累计追加的点数"""
+        return self._total
+
+    @property
+    def start(self):
+        """窗口中最早一个点的序号（从 0 开始）"""
+        return self._total - len(self)
+
+    def append(self, value):
+        seq = self._total
+        i = seq % self.capacity
+        self._data[i] = self._data[i + self.capacity] = value
+        value = self._data[i]
+        self._total += 1
+        oldest = self._total - self.capacity
+        # 移出窗口的点从队首淘汰；不可能再成为最值的点从队尾淘汰
+        while self._min and self._min[0][0] < oldest:
+            self._min.popleft()
+        while self._min and self._min[-1][1] >= value:
+            self._min.pop()
+        self._min.append((seq, value))
+        while self._max and self._max[0][0] < oldest:
+            self._max.popleft()
+        while self._max and self._max[-1][1] <= value:
+            self._max.pop()
+        self._max.append((seq, value))
+
+    def min(self):
+        """窗口内最小值，空时返回 None"""
+        return self._min[0][1] if self._min else None
+
+    def max(self):
+        return self._max[0][1] if self._max else None
+
+    def view(self):
+        """按时间顺序的窗口数据（只读视图，下一次 append 后内容会变化）"""
+        n = len(self)
+        start = (self._total - n) % self.capacity
+        view = self._data[start:start + n]
+        view.flags.writeable = False
+        return view
+
+    def last(self):
+        return self._data[(self._total - 1) % self.capacity] if self._total else None
+
+    def clear(self):
+        self._total = 0
+        self._min.clear()
+        self._max.clear()
+
+
+class ChannelSet:
+    """共用同一时间轴的多个通道（每条消息各通道追加一个点），横坐标为消息序号（从 1 开始）"""
+
+    def __init__(self, names, capacity):
+        self.capacity = capacity
+        self.channels = {name: RingBuffer(capacity) for name in names}
+        self._x = RingBuffer(capacity)
+
+    def __getitem__(self, name):
+        return self.channels[name]
+
+    def __len__(self):
+        return len(self._x)
+
+    @property
+    def count(self):
+        """累计收到的消息数"""
+        return self._x.total
+
+    def append(self, **values):
+        for name, buffer in self.channels.items():
+            buffer.append(values[name])
+        self._x.append(self._x.total + 1)
+
+    def x_view(self):
+        return self._x.view()
+
+    def x_range(self):
+        """当前窗口覆盖的横坐标范围 (最小, 最大)，与原先按 capacity 个点滚动的坐标轴一致"""
+        return max(0, self.count - self.capacity), self.count
@@ -0,0 +1,519 @@
+import queue
+import sqlite3
+import threading
+import time
+
+from embedding_codec import STORAGE_DTYPE, encode_embeddings, decode_embeddings, is_legacy
+
+try:
+    import mysql.connector
+except ImportError:  # 仅使用 SQLite 替身时可以不安装 MySQL 驱动
+    mysql = None
+
+DB_ERRORS = (sqlite3.Error,) + ((mysql.connector.Error,) if mysql else ())
+INTEGRITY_ERRORS = (sqlite3.IntegrityError,) + ((mysql.connector.IntegrityError,) if mysql else ())
+
+# 默认数据库配置（认证窗口与批量注册工具共用）
+DEFAULT_DB_CONFIG = {
+    'host': 'localhost',
+    'user': 'root',
+    'password': '123456',
+    'database': 'cyber_auth'
+}
+
+USER_COLUMNS = ("job_number", "name", "phone", "position", "status", "face_encoding")
+PROFILE_COLUMNS = USER_COLUMNS[:-1]
+# 识别热路径只需要的列：工号、分区键（状态、职务）与编码
+ENCODING_COLUMNS = ("job_number", "status", "position", "face_encoding")
+
+CREATE_USERS_TABLE = """
+CREATE TABLE IF NOT EXISTS users (
+    job_number VARCHAR(20) PRIMARY KEY,
+    name VARCHAR(50) NOT NULL,
+    phone VARCHAR(20),
+    position VARCHAR(50),
+    status VARCHAR(20),
+    face_encoding BLOB,
+    {updated_at}
+)
+"""
+
+# updated_at 作为增量同步水位线；SQLite 不支持 ON UPDATE，由写入语句显式维护
+UPDATED_AT_COLUMN = {
+    "mysql": "updated_at TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),\n"
+             "    INDEX idx_users_updated_at (updated_at)",
+    "sqlite": "updated_at TIMESTAMP DEFAULT (STRFTIME('%Y-%m-%d %H:%M:%f', 'now'))",
+}
+
+# 删除记录表：由触发器在删除用户时写入，增量同步据此发现删除，无需每次统计全表
+CREATE_DELETIONS_TABLE = {
+    "mysql": """
+CREATE TABLE IF NOT EXISTS user_deletions (
+    job_number VARCHAR(20) PRIMARY KEY,
+    deleted_at TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
+    INDEX idx_user_deletions_deleted_at (deleted_at)
+)
+""",
+    "sqlite": """
+CREATE TABLE IF NOT EXISTS user_deletions (
+    job_number VARCHAR(20) PRIMARY KEY,
+    deleted_at TIMESTAMP DEFAULT (STRFTIME('%Y-%m-%d %H:%M:%f', 'now'))
+)
+""",
+}
+
+# 删除用户时记录工号；同一工号重新注册时清除其删除记录
+DELETION_TRIGGERS = {
+    "mysql": {
+        "users_after_delete": """
+CREATE TRIGGER users_after_delete AFTER DELETE ON users FOR EACH ROW
+    INSERT INTO user_deletions (job_number) VALUES (OLD.job_number)
+    ON DUPLICATE KEY UPDATE deleted_at = CURRENT_TIMESTAMP(6)
+""",
+        "users_after_insert": """
+CREATE TRIGGER users_after_insert AFTER INSERT ON users FOR EACH ROW
+    DELETE FROM user_deletions WHERE job_number = NEW.job_number
+""",
+    },
+    "sqlite": {
+        "users_after_delete": """
+CREATE TRIGGER IF NOT EXISTS users_after_delete AFTER DELETE ON users BEGIN
+    INSERT OR REPLACE INTO user_deletions (job_number, deleted_at)
+    VALUES (OLD.job_number, STRFTIME('%Y-%m-%d %H:%M:%f', 'now'));
+END
+""",
+        "users_after_insert": """
+CREATE TRIGGER IF NOT EXISTS users_after_insert AFTER INSERT ON users BEGIN
+    DELETE FROM user_deletions WHERE job_number = NEW.job_number;
+END
+""",
+    },
+}
+
+
+class UserStore:
+    """用户库存储层
+
+    每个线程持有独立连接（互不共享游标与事务），注册写入进入队列，
+    由后台写线程用预编译 INSERT 分批提交。backend 为 "sqlite" 时
+    db_config["database"] 为数据库文件路径，便于无 MySQL 环境下测试。
+    """
+
+    def __init__(self, db_config, backend="mysql", batch_size=32, batch_wait=0.05,
+                 health_check_interval=30.0):
+        if backend == "mysql" and mysql is None:
+            raise RuntimeError("未安装 mysql-connector-python")
+        self.db_config = db_config
+        self.backend = backend
+        self.placeholder = "%s" if backend == "mysql" else "?"
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.health_check_interval = health_check_interval
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._writer = None
+        self._closed = False
+
+    # ---------- 连接管理 ----------
+
+    def _open(self):
+        if self.backend == "sqlite":
+            # 连接只在创建它的线程中使用；关闭时可能来自其他线程
+            return sqlite3.connect(self.db_config["database"], timeout=10, check_same_thread=False)
+        return mysql.connector.connect(
+            host=self.db_config["host"],
+            user=self.db_config["user"],
+            password=self.db_config["password"],
+            database=self.db_config["database"],
+        )
+
+    def _healthy(self, connection):
+        if self.backend == "sqlite":
+            return True
+        try:
+            connection.ping(reconnect=True, attempts=1, delay=0)
+            return True
+        except DB_ERRORS:
+            return False
+
+    def connection(self):
+        """返回当前线程专属连接；空闲较久时先做健康检查，失效则重连"""
+        local = self._local
+        connection = getattr(local, "connection", None)
+        now = time.monotonic()
+        if connection is not None and now - local.last_used > self.health_check_interval:
+            if not self._healthy(connection):
+                self._discard(connection)
+                connection = None
+        if connection is None:
+            connection = self._open()
+            local.connection = connection
+            with self._connections_lock:
+                self._connections.append(connection)
+        local.last_used = now
+        return connection
+
+    def _discard(self, connection):
+        with self._connections_lock:
+            if connection in self._connections:
+                self._connections.remove(connection)
+        try:
+            connection.close()
+        except DB_ERRORS:
+            pass
+        self._local.connection = None
+
+    def ensure_schema(self):
+        """创建数据库（MySQL）与用户表"""
+        if self.backend == "mysql":
+            connection = mysql.connector.connect(
+                host=self.db_config["host"],
+                user=self.db_config["user"],
+                password=self.db_config["password"],
+            )
+            cursor = connection.cursor()
+            cursor.execute(f"CREATE DATABASE IF NOT EXISTS {self.db_config['database']}")
+            cursor.close()
+            connection.close()
+        connection = self.connection()
+        cursor = connection.cursor()
+        cursor.execute(CREATE_USERS_TABLE.format(updated_at=UPDATED_AT_COLUMN[self.backend]))
+        cursor.execute(CREATE_DELETIONS_TABLE[self.backend])
+        connection.commit()
+        cursor.close()
+        self._migrate_updated_at()
+        self._ensure_index("users", "idx_users_updated_at", "updated_at")
+        self._ensure_index("user_deletions", "idx_user_deletions_deleted_at", "deleted_at")
+        self._ensure_triggers()
+
+    def _migrate_updated_at(self):
+        """旧表没有 updated_at 列时补上，已有行视为当前时间写入"""
+        connection = self.connection()
+        cursor = connection.cursor()
+        try:
+            if self.backend == "sqlite":
+                cursor.execute("PRAGMA table_info(users)")
+                columns = {row[1] for row in cursor.fetchall()}
+            else:
+                cursor.execute("SHOW COLUMNS FROM users")
+                columns = {row[0] for row in cursor.fetchall()}
+            if "updated_at" in columns:
+                return
+            if self.backend == "sqlite":
+                # SQLite 新增列不能带非常量默认值，先加列再回填
+                cursor.execute("ALTER TABLE users ADD COLUMN updated_at TIMESTAMP")
+                cursor.execute("UPDATE users SET updated_at = STRFTIME('%Y-%m-%d %H:%M:%f', 'now')")
+            else:
+                cursor.execute("ALTER TABLE users ADD COLUMN updated_at TIMESTAMP(6) NOT NULL "
+                               "DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6)")
+            connection.commit()
+        finally:
+            cursor.close()
+
+    def _ensure_index(self, table, name, column):
+        """旧表缺少索引时补建（增量同步按时间列做范围查询，没有索引会全表扫描）"""
+        connection = self.connection()
+        cursor = connection.cursor()
+        try:
+            if self.backend == "sqlite":
+                cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({column})")
+            else:
+                cursor.execute(f"SHOW INDEX FROM {table} WHERE Key_name = %s", (name,))
+                if cursor.fetchall():
+                    return
+                cursor.execute(f"CREATE INDEX {name} ON {table} ({column})")
+            connection.commit()
+        finally:
+            cursor.close()
+
+    def _ensure_triggers(self):
+        """创建维护删除记录的触发器"""
+        connection = self.connection()
+        cursor = connection.cursor()
+        try:
+            triggers = DELETION_TRIGGERS[self.backend]
+            if self.backend == "mysql":
+                # 较早的 MySQL 不支持 CREATE TRIGGER IF NOT EXISTS
+                cursor.execute("SELECT TRIGGER_NAME FROM information_schema.TRIGGERS "
+                               "WHERE TRIGGER_SCHEMA = DATABASE()")
+                existing = {row[0] for row in cursor.fetchall()}
+                triggers = {name: ddl for name, ddl in triggers.items() if name not in existing}
+            for ddl in triggers.values():
+                cursor.execute(ddl)
+            connection.commit()
+        finally:
+            cursor.close()
+
+    # ---------- 读取 ----------
+
+    def fetch_users(self, columns=USER_COLUMNS):
+        """读取全部用户行"""
+        connection = self.connection()
+        cursor = connection.cursor()
+        try:
+            cursor.execute(f"SELECT {', '.join(columns)} FROM users")
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+
+    def fetch_profiles(self, job_numbers=None, chunk_size=500):
+        """读取用户资料（不含编码 BLOB）；给出 job_numbers 时只读取这些用户"""
+        connection = self.connection()
+        cursor = connection.cursor()
+        try:
+            query = f"SELECT {', '.join(PROFILE_COLUMNS)} FROM users"
+            if job_numbers is None:
+                cursor.execute(query)
+                return cursor.fetchall()
+            rows = []
+            job_numbers = list(job_numbers)
+            # 分块查询，避免超出 SQLite 的参数个数上限
+            for start in range(0, len(job_numbers), chunk_size):
+                chunk = job_numbers[start:start + chunk_size]
+                marks = ", ".join([self.placeholder] * len(chunk))
+                cursor.execute(f"{query} WHERE job_number IN ({marks})", chunk)
+                rows.extend(cursor.fetchall())
+            return rows
+        finally:
+            cursor.close()
+
+    def fetch_job_numbers(self):
+        """读取全部工号（用于剔除已删除的用户）"""
+        connection = self.connection()
+        cursor = connection.cursor()
+        try:
+            cursor.execute("SELECT job_number FROM users")
+            return [row[0] for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+
+    def fetch_watermark(self):
+        """当前表中最大的 updated_at，空表返回 None"""
+        connection = self.connection()
+        cursor = connection.cursor()
+        try:
+            cursor.execute("SELECT MAX(updated_at) FROM users")
+            value = cursor.fetchone()[0]
+            return None if value is None else str(value)
+        finally:
+            cursor.close()
+
+    def fetch_deletion_watermark(self):
+        """删除记录中最大的 deleted_at，没有记录时返回 None"""
+        connection = self.connection()
+        cursor = connection.cursor()
+        try:
+            cursor.execute("SELECT MAX(deleted_at) FROM user_deletions")
+            value = cursor.fetchone()[0]
+            return None if value is None else str(value)
+        finally:
+            cursor.close()
+
+    def fetch_deleted(self, watermark, overlap=0):
+        """读取 deleted_at 不早于水位线（减去回看窗口）的删除记录，返回 [(工号, deleted_at)]"""
+        query = "SELECT job_number, deleted_at FROM user_deletions"
+        params = ()
+        if watermark is not None:
+            query += f" WHERE deleted_at >= {self._since(overlap)}"
+            params = (watermark,)
+        connection = self.connection()
+        cursor = connection.cursor()
+        try:
+            cursor.execute(query, params)
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+
+    def _since(self, overlap):
+        """水位线减去 overlap 秒的 SQL 表达式（水位线作为参数传入）"""
+        if self.backend == "sqlite":
+            return f"STRFTIME('%Y-%m-%d %H:%M:%f', {self.placeholder}, '-{float(overlap)} seconds')"
+        return f"{self.placeholder} - INTERVAL {int(overlap * 1e6)} MICROSECOND"
+
+    def fetch_changed(self, watermark, columns=USER_COLUMNS, overlap=0):
+        """读取 updated_at 不早于水位线的用户行；水位线为 None 时读取全部
+
+        overlap 秒为回看窗口：事务提交晚于其 updated_at 时，该行可能在水位线
+        推进之后才可见，回看窗口内的行会被再次读取，由调用方去重。
+        """
+        if watermark is None:
+            return self.fetch_users(columns)
+        bound = self._since(overlap)
+        connection = self.connection()
+        cursor = connection.cursor()
+        try:
+            cursor.execute(
+                f"SELECT {', '.join(columns)} FROM users WHERE updated_at >= {bound}",
+                (watermark,),
+            )
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+
+    # ---------- 写入 ----------
+
+    @property
+    def insert_query(self):
+        values = ", ".join([self.placeholder] * len(USER_COLUMNS))
+        return f"INSERT INTO users ({', '.join(USER_COLUMNS)}) VALUES ({values})"
+
+    @property
+    def update_encoding_query(self):
+        """更新编码的语句；SQLite 没有 ON UPDATE，显式刷新 updated_at 使各终端增量同步到新编码"""
+        if self.backend == "sqlite":
+            return (f"UPDATE users SET face_encoding = {self.placeholder}, "
+                    f"updated_at = STRFTIME('%Y-%m-%d %H:%M:%f', 'now') "
+                    f"WHERE job_number = {self.placeholder}")
+        return "UPDATE users SET face_encoding = %s WHERE job_number = %s"
+
+    def update_encodings(self, rows):
+        """在一个事务中替换已有用户的编码，rows 为 (编码 BLOB, 工号)，返回更新的行数"""
+        return self._execute_batch(self.update_encoding_query, [tuple(row) for row in rows])
+
+    def _cursor(self, connection):
+        if self.backend == "mysql":
+            return connection.cursor(prepared=True)
+        return connection.cursor()
+
+    def enqueue_user(self, row, callback=None):
+        """提交一条注册记录到后台批量写入队列
+
+        row 按 USER_COLUMNS 顺序排列；callback(row, error) 在写线程中调用，
+        成功时 error 为 None。
+        """
+        if self._writer is None:
+            self._writer = threading.Thread(target=self._write_loop, name="UserStoreWriter", daemon=True)
+            self._writer.start()
+        self._queue.put((tuple(row), callback))
+
+    def pending_writes(self):
+        return self._queue.qsize()
+
+    def _next_batch(self):
+        try:
+            first = self._queue.get(timeout=self.health_check_interval)
+        except queue.Empty:
+            return []
+        batch = [first]
+        deadline = time.monotonic() + self.batch_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write_loop(self):
+        while not self._closed:
+            batch = self._next_batch()
+            if not batch:
+                # 空闲时在写线程上做健康检查，避免阻塞界面线程
+                try:
+                    self.connection()
+                except DB_ERRORS:
+                    pass
+                continue
+            # 关闭标记可能夹在一批中间：剔除后批中其余的行照常写入，之后不再取新任务
+            if any(row is None for row, _ in batch):
+                batch = [item for item in batch if item[0] is not None]
+                self._closed = True
+            if batch:
+                self._write_batch(batch)
+
+    def _write_batch(self, batch):
+        results = self.insert_many([row for row, _ in batch])
+        for (row, error), (_, callback) in zip(results, batch):
+            if callback:
+                callback(row, error)
+
+    def insert_many(self, rows):
+        """在一个事务中同步插入多行，返回 [(row, error)]
+
+        有冲突时回滚并逐条重试以定位失败行；连接失效时丢弃，下次调用自动重连。
+        """
+        rows = [tuple(row) for row in rows]
+        try:
+            connection = self.connection()
+            cursor = self._cursor(connection)
+            try:
+                cursor.executemany(self.insert_query, rows)
+                connection.commit()
+            finally:
+                cursor.close()
+            return [(row, None) for row in rows]
+        except INTEGRITY_ERRORS:
+            connection.rollback()
+            return [(row, self._insert_one(row)) for row in rows]
+        except DB_ERRORS as e:
+            connection = getattr(self._local, "connection", None)
+            if connection is not None:
+                self._discard(connection)
+            return [(row, e) for row in rows]
+
+    def _insert_one(self, row):
+        connection = self.connection()
+        cursor = self._cursor(connection)
+        try:
+            cursor.execute(self.insert_query, row)
+            connection.commit()
+            return None
+        except DB_ERRORS as e:
+            connection.rollback()
+            return e
+        finally:
+            cursor.close()
+
+    # ---------- 迁移 ----------
+
+    def migrate_encodings(self, dtype=STORAGE_DTYPE, batch_size=500):
+        """把旧版无头部的 float64 编码 BLOB 改写为带头部的紧凑格式，返回改写行数
+
+        只改写旧格式的行，可重复执行。改写会更新 updated_at，
+        各终端下次增量同步时会重新拉取这些行（新格式旧版本程序无法读取，
+        应在所有终端升级后再执行）。
+        """
+        query = self.update_encoding_query
+        migrated = 0
+        pending = []
+        for job_number, _, _, _, _, blob in self.fetch_users():
+            if blob is None or not is_legacy(blob):
+                continue
+            pending.append((encode_embeddings(decode_embeddings(blob), dtype), job_number))
+            if len(pending) >= batch_size:
+                migrated += self._execute_batch(query, pending)
+                pending = []
+        if pending:
+            migrated += self._execute_batch(query, pending)
+        return migrated
+
+    def _execute_batch(self, query, rows):
+        connection = self.connection()
+        cursor = self._cursor(connection)
+        try:
+            cursor.executemany(query, rows)
+            connection.commit()
+            return len(rows)
+        except DB_ERRORS:
+            connection.rollback()
+            raise
+        finally:
+            cursor.close()
+
+    def close(self):
+        """等待写队列清空后关闭所有连接"""
+        if self._writer is not None and self._writer.is_alive():
+            self._queue.put((None, None))
+            self._writer.join(timeout=5.0)
+        self._closed = True
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for connection in connections:
+            try:
+                connection.close()
+            except DB_ERRORS:
+                pass